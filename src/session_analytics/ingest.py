@@ -5,6 +5,7 @@ from __future__ import annotations
 import json
 import logging
 import re
+import sys
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -20,6 +21,16 @@ DEFAULT_LOGS_DIR = Path.home() / ".claude" / "projects"
 USER_MESSAGE_MAX_LENGTH = 2000
 
 
+def _intern(value: str | None) -> str | None:
+    """Intern a low-cardinality string field (session id, tool name, branch, ...).
+
+    json.loads() builds a new string for every occurrence, and a file's events
+    are held in memory until its batch insert, so repeated values would
+    otherwise be stored once per event.
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
 def decode_project_path(encoded: str) -> Path | None:
     """Decode an encoded project path back to a filesystem path.
 
@@ -151,20 +162,23 @@ def detect_compaction(text: str | None) -> bool:
 
 
 def find_log_files(
-    logs_dir: Path = DEFAULT_LOGS_DIR,
+    logs_dir: Path | None = None,
     days: int = 7,
     project_filter: str | None = None,
 ) -> list[Path]:
     """Find JSONL log files within the specified time range.
 
     Args:
-        logs_dir: Directory containing project subdirectories
+        logs_dir: Directory containing project subdirectories (default: DEFAULT_LOGS_DIR,
+            resolved at call time)
         days: Only include files modified within this many days
         project_filter: Optional project path to filter (encoded form)
 
     Returns:
         List of JSONL file paths, sorted by modification time (newest first)
     """
+    if logs_dir is None:
+        logs_dir = DEFAULT_LOGS_DIR
     if not logs_dir.exists():
         logger.warning(f"Logs directory does not exist: {logs_dir}")
         return []
@@ -243,7 +257,7 @@ def parse_tool_use(tool_use: dict) -> dict:
     file_path, skill_name
     """
     result = {
-        "tool_name": tool_use.get("name"),
+        "tool_name": _intern(tool_use.get("name")),
         "tool_id": tool_use.get("id"),
         "tool_input_json": json.dumps(tool_use.get("input", {})),
         "command": None,
@@ -260,7 +274,7 @@ def parse_tool_use(tool_use: dict) -> dict:
         cmd = tool_input.get("command", "")
         if cmd:
             parts = cmd.split(None, 1)
-            result["command"] = parts[0] if parts else None
+            result["command"] = _intern(parts[0]) if parts else None
             result["command_args"] = parts[1] if len(parts) > 1 else None
 
     # Extract file path for file operations
@@ -299,7 +313,7 @@ def parse_entry(raw: dict, project_path: str) -> list[Event]:
         return []
 
     uuid = raw.get("uuid")
-    session_id = raw.get("sessionId")
+    session_id = _intern(raw.get("sessionId"))
     timestamp_str = raw.get("timestamp")
 
     # Skip entries without required fields
@@ -319,8 +333,8 @@ def parse_entry(raw: dict, project_path: str) -> list[Event]:
         return []
 
     # Extract common fields
-    cwd = raw.get("cwd")
-    git_branch = raw.get("gitBranch")
+    cwd = _intern(raw.get("cwd"))
+    git_branch = _intern(raw.get("gitBranch"))
 
     # Extract token usage from assistant messages
     message = raw.get("message", {})
@@ -329,12 +343,12 @@ def parse_entry(raw: dict, project_path: str) -> list[Event]:
     output_tokens = usage.get("output_tokens")
     cache_read_tokens = usage.get("cache_read_input_tokens")
     cache_creation_tokens = usage.get("cache_creation_input_tokens")
-    model = message.get("model")
+    model = _intern(message.get("model"))
 
     # RFC #41: Extract agent tracking fields
-    agent_id = raw.get("agentId")  # Present only in agent-*.jsonl files
+    agent_id = _intern(raw.get("agentId"))  # Present only in agent-*.jsonl files
     is_sidechain = raw.get("isSidechain", False)  # True for agent/background work
-    version = raw.get("version")  # Claude Code version
+    version = _intern(raw.get("version"))  # Claude Code version
 
     events = []
 
@@ -466,7 +466,9 @@ def analyze_failures(
         session_id = row["session_id"]
         errors_by_session[session_id] = errors_by_session.get(session_id, 0) + 1
 
-    # Get error counts by associated tool (from tool_use before tool_result)
+    # Get error counts by associated tool (from tool_use before tool_result).
+    # The failed results are read from idx_events_error_results and each is
+    # matched to its tool_use through idx_events_tool_id.
     tool_error_counts = storage.execute_query(
         """
         SELECT
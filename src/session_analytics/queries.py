@@ -2,7 +2,9 @@
 
 from __future__ import annotations
 
+import heapq
 import re
+import weakref
 from datetime import datetime, timedelta
 
 from session_analytics.storage import SQLiteStorage
@@ -55,18 +57,19 @@ def build_where_clause(
     return where_clause, params
 
 
-def get_cutoff(days: int | float = 7, hours: float = 0) -> datetime:
+def get_cutoff(days: int | float = 7, hours: float = 0, now: datetime | None = None) -> datetime:
     """Calculate cutoff datetime from days/hours ago.
 
     Args:
         days: Number of days to look back (can be fractional)
         hours: Additional hours to look back
+        now: Reference time to look back from (default: current time)
 
     Returns:
         datetime representing the cutoff point
     """
     total_hours = (days * 24) + hours
-    return datetime.now() - timedelta(hours=total_hours)
+    return (now or datetime.now()) - timedelta(hours=total_hours)
 
 
 def normalize_datetime(dt: datetime) -> datetime:
@@ -90,6 +93,10 @@ def normalize_datetime(dt: datetime) -> datetime:
     return dt
 
 
+# Most recent ingestion time read from each storage; see ensure_fresh_data().
+_last_ingest_seen: weakref.WeakKeyDictionary[SQLiteStorage, datetime] = weakref.WeakKeyDictionary()
+
+
 def ensure_fresh_data(
     storage: SQLiteStorage,
     max_age_minutes: int = 5,
@@ -115,8 +122,17 @@ def ensure_fresh_data(
         ingest_logs(storage, days=days, project=project)
         return True
 
+    # Ingestion time only moves forward, so an ingest already seen within
+    # max_age proves the data is fresh without reading ingestion_state again.
+    max_age = timedelta(minutes=max_age_minutes)
+    seen = _last_ingest_seen.get(storage)
+    if seen is not None and datetime.now() - seen <= max_age:
+        return False
+
     last_ingest = storage.get_last_ingestion_time()
-    if last_ingest is None or (datetime.now() - last_ingest) > timedelta(minutes=max_age_minutes):
+    if last_ingest is not None:
+        _last_ingest_seen[storage] = last_ingest
+    if last_ingest is None or (datetime.now() - last_ingest) > max_age:
         from session_analytics.ingest import ingest_logs
 
         ingest_logs(storage, days=days, project=project)
@@ -385,6 +401,12 @@ def query_timeline(
     }
 
 
+# MCP tool names ("mcp__<server>__<tool>") as a tool_name range, so the filter
+# seeks idx_events_tool_timestamp instead of testing a LIKE against every entry.
+# "`" is the character right after "_", so 'mcp_`' bounds every "mcp__" name.
+_MCP_TOOL_RANGE = "tool_name >= 'mcp__' AND tool_name < 'mcp_`'"
+
+
 def query_commands(
     storage: SQLiteStorage,
     days: int = 7,
@@ -409,10 +431,11 @@ def query_commands(
         extra_conditions=["tool_name = 'Bash'", "command IS NOT NULL"],
     )
 
-    # Add prefix filter if specified
+    # Add prefix filter if specified. LIKE keeps ASCII case-insensitive
+    # matching; "%", "_" and "\" in the prefix are escaped so they match literally
     if prefix:
-        where_clause += " AND command LIKE ?"
-        params.append(f"{prefix}%")
+        where_clause += " AND command LIKE ? ESCAPE '\\'"
+        params.append(re.sub(r"([\\%_])", r"\\\1", prefix) + "%")
 
     # Get command frequency counts
     rows = storage.execute_query(
@@ -506,6 +529,19 @@ def query_sessions(
     }
 
 
+# query_tokens() groupings: by -> (key columns as {output key: SELECT expression},
+# GROUP BY expression, ORDER BY clause)
+_TOKEN_GROUPINGS: dict[str, tuple[dict[str, str], str, str]] = {
+    "day": ({"day": "DATE(timestamp)"}, "DATE(timestamp)", "day DESC"),
+    "session": (
+        {"session_id": "session_id", "project": "project_path"},
+        "session_id",
+        "input_tokens DESC",
+    ),
+    "model": ({"model": "COALESCE(model, 'unknown')"}, "model", "input_tokens DESC"),
+}
+
+
 def query_tokens(
     storage: SQLiteStorage,
     days: int = 7,
@@ -523,114 +559,47 @@ def query_tokens(
     Returns:
         Dict with token usage breakdown
     """
+    if by not in _TOKEN_GROUPINGS:
+        return {
+            "error": f"Invalid grouping: {by}. Use 'day', 'session', or 'model'.",
+        }
+    key_columns, group_by, order_by = _TOKEN_GROUPINGS[by]
+
     cutoff = get_cutoff(days=days)
     where_clause, params = build_where_clause(
         cutoff=cutoff,
         project=project,
     )
 
-    if by == "day":
-        # Group by day
-        rows = storage.execute_query(
-            f"""
-            SELECT
-                DATE(timestamp) as day,
-                SUM(COALESCE(input_tokens, 0)) as input_tokens,
-                SUM(COALESCE(output_tokens, 0)) as output_tokens,
-                SUM(COALESCE(cache_read_tokens, 0)) as cache_read_tokens,
-                SUM(COALESCE(cache_creation_tokens, 0)) as cache_creation_tokens,
-                COUNT(*) as event_count
-            FROM events
-            WHERE {where_clause}
-            GROUP BY DATE(timestamp)
-            ORDER BY day DESC
-            """,
-            params,
-        )
-
-        breakdown = [
-            {
-                "day": row["day"],
-                "input_tokens": row["input_tokens"],
-                "output_tokens": row["output_tokens"],
-                "cache_read_tokens": row["cache_read_tokens"],
-                "cache_creation_tokens": row["cache_creation_tokens"],
-                "event_count": row["event_count"],
-            }
-            for row in rows
-        ]
-        group_key = "day"
-
-    elif by == "session":
-        # Group by session
-        rows = storage.execute_query(
-            f"""
-            SELECT
-                session_id,
-                project_path,
-                SUM(COALESCE(input_tokens, 0)) as input_tokens,
-                SUM(COALESCE(output_tokens, 0)) as output_tokens,
-                SUM(COALESCE(cache_read_tokens, 0)) as cache_read_tokens,
-                SUM(COALESCE(cache_creation_tokens, 0)) as cache_creation_tokens,
-                COUNT(*) as event_count
-            FROM events
-            WHERE {where_clause}
-            GROUP BY session_id
-            ORDER BY input_tokens DESC
-            """,
-            params,
-        )
-
-        breakdown = [
-            {
-                "session_id": row["session_id"],
-                "project": row["project_path"],
-                "input_tokens": row["input_tokens"],
-                "output_tokens": row["output_tokens"],
-                "cache_read_tokens": row["cache_read_tokens"],
-                "cache_creation_tokens": row["cache_creation_tokens"],
-                "event_count": row["event_count"],
-            }
-            for row in rows
-        ]
-        group_key = "session"
-
-    elif by == "model":
-        # Group by model
-        rows = storage.execute_query(
-            f"""
-            SELECT
-                COALESCE(model, 'unknown') as model,
-                SUM(COALESCE(input_tokens, 0)) as input_tokens,
-                SUM(COALESCE(output_tokens, 0)) as output_tokens,
-                SUM(COALESCE(cache_read_tokens, 0)) as cache_read_tokens,
-                SUM(COALESCE(cache_creation_tokens, 0)) as cache_creation_tokens,
-                COUNT(*) as event_count
-            FROM events
-            WHERE {where_clause}
-            GROUP BY model
-            ORDER BY input_tokens DESC
-            """,
-            params,
-        )
-
-        breakdown = [
-            {
-                "model": row["model"],
-                "input_tokens": row["input_tokens"],
-                "output_tokens": row["output_tokens"],
-                "cache_read_tokens": row["cache_read_tokens"],
-                "cache_creation_tokens": row["cache_creation_tokens"],
-                "event_count": row["event_count"],
-            }
-            for row in rows
-        ]
-        group_key = "model"
+    key_select = ", ".join(f"{expr} as {key}" for key, expr in key_columns.items())
+    rows = storage.execute_query(
+        f"""
+        SELECT
+            {key_select},
+            SUM(COALESCE(input_tokens, 0)) as input_tokens,
+            SUM(COALESCE(output_tokens, 0)) as output_tokens,
+            SUM(COALESCE(cache_read_tokens, 0)) as cache_read_tokens,
+            SUM(COALESCE(cache_creation_tokens, 0)) as cache_creation_tokens,
+            COUNT(*) as event_count
+        FROM events
+        WHERE {where_clause}
+        GROUP BY {group_by}
+        ORDER BY {order_by}
+        """,
+        params,
+    )
 
-    else:
-        return {
-            "error": f"Invalid grouping: {by}. Use 'day', 'session', or 'model'.",
+    breakdown = [
+        {
+            **{key: row[key] for key in key_columns},
+            "input_tokens": row["input_tokens"],
+            "output_tokens": row["output_tokens"],
+            "cache_read_tokens": row["cache_read_tokens"],
+            "cache_creation_tokens": row["cache_creation_tokens"],
+            "event_count": row["event_count"],
         }
+        for row in rows
+    ]
 
     # Calculate totals
     total_input = sum(b["input_tokens"] for b in breakdown)
@@ -641,7 +610,7 @@ def query_tokens(
     return {
         "days": days,
         "project": project,
-        "group_by": group_key,
+        "group_by": by,
         "total_input_tokens": total_input,
         "total_output_tokens": total_output,
         "total_cache_read_tokens": total_cache_read,
@@ -698,13 +667,16 @@ def get_user_journey(
     params.extend(entry_types)
     params.append(limit)
 
+    # Only fetch project_path when the caller asked for project info
+    project_column = "project_path," if include_projects else ""
+
     # Query messages ordered by timestamp
     rows = storage.execute_query(
         f"""
         SELECT
             timestamp,
             session_id,
-            project_path,
+            {project_column}
             entry_type,
             message_text
         FROM events
@@ -725,13 +697,6 @@ def get_user_journey(
     last_project = None
 
     for row in rows:
-        project = row["project_path"]
-        if project:
-            projects_seen.add(project)
-            if last_project and project != last_project:
-                project_switches += 1
-            last_project = project
-
         # Truncate message if max_message_length is set
         message_text = row["message_text"]
         if message_text and max_message_length > 0:
@@ -744,6 +709,12 @@ def get_user_journey(
             "message": message_text,
         }
         if include_projects:
+            project = row["project_path"]
+            if project:
+                projects_seen.add(project)
+                if last_project and project != last_project:
+                    project_switches += 1
+                last_project = project
             event["project"] = project
         journey.append(event)
 
@@ -817,39 +788,48 @@ def detect_parallel_sessions(
             }
         )
 
-    # Find overlapping periods
-    parallel_periods = []
+    # Find overlapping pairs with a sweep over start times. Sessions are ordered by
+    # start, so once an active session ends before `start + min_overlap` it cannot
+    # overlap this session or any later one enough, and leaves the heap for good.
+    # Only still-active sessions are compared, instead of every pair.
     min_overlap = timedelta(minutes=min_overlap_minutes)
+    active: list[tuple[datetime, int]] = []  # (end, index) min-heap
+    overlaps: list[tuple[timedelta, int, int]] = []
+
+    for j, s2 in enumerate(sessions):
+        start = s2["start"]
+        while active and (active[0][0] <= start or active[0][0] - start < min_overlap):
+            heapq.heappop(active)
+        for end, i in active:
+            overlap_duration = min(end, s2["end"]) - start
+            if overlap_duration > timedelta(0) and overlap_duration >= min_overlap:
+                overlaps.append((overlap_duration, i, j))
+        heapq.heappush(active, (s2["end"], j))
+
+    # Sort by duration (in whole minutes) descending, then in session start order
+    overlaps.sort(key=lambda x: (-int(x[0].total_seconds() / 60), x[1], x[2]))
 
-    for i, s1 in enumerate(sessions):
-        for s2 in sessions[i + 1 :]:
-            # Calculate overlap
-            overlap_start = max(s1["start"], s2["start"])
-            overlap_end = min(s1["end"], s2["end"])
-
-            if overlap_end > overlap_start:
-                overlap_duration = overlap_end - overlap_start
-                if overlap_duration >= min_overlap:
-                    parallel_periods.append(
-                        {
-                            "start": overlap_start.isoformat(),
-                            "end": overlap_end.isoformat(),
-                            "duration_minutes": int(overlap_duration.total_seconds() / 60),
-                            "sessions": [
-                                {
-                                    "session_id": s1["session_id"],
-                                    "project": s1["project"],
-                                },
-                                {
-                                    "session_id": s2["session_id"],
-                                    "project": s2["project"],
-                                },
-                            ],
-                        }
-                    )
-
-    # Sort by duration descending
-    parallel_periods.sort(key=lambda x: x["duration_minutes"], reverse=True)
+    parallel_periods = []
+    for overlap_duration, i, j in overlaps:
+        s1, s2 = sessions[i], sessions[j]
+        overlap_start = s2["start"]
+        parallel_periods.append(
+            {
+                "start": overlap_start.isoformat(),
+                "end": (overlap_start + overlap_duration).isoformat(),
+                "duration_minutes": int(overlap_duration.total_seconds() / 60),
+                "sessions": [
+                    {
+                        "session_id": s1["session_id"],
+                        "project": s1["project"],
+                    },
+                    {
+                        "session_id": s2["session_id"],
+                        "project": s2["project"],
+                    },
+                ],
+            }
+        )
 
     return {
         "hours": hours,
@@ -885,108 +865,14 @@ def find_related_sessions(
 
     if method == "files":
         # Find sessions that touched the same files
-        # First get files touched by the target session
-        target_files = storage.execute_query(
-            """
-            SELECT DISTINCT file_path
-            FROM events
-            WHERE session_id = ? AND file_path IS NOT NULL
-            """,
-            (session_id,),
-        )
-        file_paths = [r["file_path"] for r in target_files]
-
-        if not file_paths:
-            return {
-                "session_id": session_id,
-                "method": method,
-                "related_count": 0,
-                "related_sessions": [],
-            }
-
-        # Find other sessions that touched these files
-        placeholders = ",".join("?" * len(file_paths))
-        rows = storage.execute_query(
-            f"""
-            SELECT
-                session_id,
-                project_path,
-                COUNT(DISTINCT file_path) as shared_files,
-                MIN(timestamp) as first_seen,
-                MAX(timestamp) as last_seen
-            FROM events
-            WHERE session_id != ?
-              AND timestamp >= ?
-              AND file_path IN ({placeholders})
-            GROUP BY session_id
-            ORDER BY shared_files DESC
-            LIMIT ?
-            """,
-            (session_id, cutoff, *file_paths, limit),
-        )
-
-        related = [
-            {
-                "session_id": r["session_id"],
-                "project": r["project_path"],
-                "shared_files": r["shared_files"],
-                "first_seen": _format_timestamp(r["first_seen"]),
-                "last_seen": _format_timestamp(r["last_seen"]),
-            }
-            for r in rows
-        ]
+        related = _sessions_sharing(storage, session_id, "file_path", "shared_files", cutoff, limit)
 
     elif method == "commands":
         # Find sessions that used the same commands
-        target_commands = storage.execute_query(
-            """
-            SELECT DISTINCT command
-            FROM events
-            WHERE session_id = ? AND command IS NOT NULL
-            """,
-            (session_id,),
-        )
-        commands = [r["command"] for r in target_commands]
-
-        if not commands:
-            return {
-                "session_id": session_id,
-                "method": method,
-                "related_count": 0,
-                "related_sessions": [],
-            }
-
-        placeholders = ",".join("?" * len(commands))
-        rows = storage.execute_query(
-            f"""
-            SELECT
-                session_id,
-                project_path,
-                COUNT(DISTINCT command) as shared_commands,
-                MIN(timestamp) as first_seen,
-                MAX(timestamp) as last_seen
-            FROM events
-            WHERE session_id != ?
-              AND timestamp >= ?
-              AND command IN ({placeholders})
-            GROUP BY session_id
-            ORDER BY shared_commands DESC
-            LIMIT ?
-            """,
-            (session_id, cutoff, *commands, limit),
+        related = _sessions_sharing(
+            storage, session_id, "command", "shared_commands", cutoff, limit
         )
 
-        related = [
-            {
-                "session_id": r["session_id"],
-                "project": r["project_path"],
-                "shared_commands": r["shared_commands"],
-                "first_seen": _format_timestamp(r["first_seen"]),
-                "last_seen": _format_timestamp(r["last_seen"]),
-            }
-            for r in rows
-        ]
-
     elif method == "temporal":
         # Find sessions that were active around the same time
         # Get the time range of the target session
@@ -1062,6 +948,128 @@ def find_related_sessions(
     }
 
 
+def _sessions_sharing(
+    storage: SQLiteStorage,
+    session_id: str,
+    column: str,
+    count_key: str,
+    cutoff: datetime,
+    limit: int,
+) -> list[dict]:
+    """Rank other sessions by how many distinct `column` values they share with session_id.
+
+    The target session's values are an uncorrelated subquery, so SQLite builds
+    them once and probes it per row in a single round-trip, with no bound
+    parameter per value.
+    """
+    rows = storage.execute_query(
+        f"""
+        SELECT
+            session_id,
+            project_path,
+            COUNT(DISTINCT {column}) as shared,
+            MIN(timestamp) as first_seen,
+            MAX(timestamp) as last_seen
+        FROM events
+        WHERE session_id != ?
+          AND timestamp >= ?
+          AND {column} IN (
+              SELECT {column} FROM events WHERE session_id = ? AND {column} IS NOT NULL
+          )
+        GROUP BY session_id
+        ORDER BY shared DESC
+        LIMIT ?
+        """,
+        (session_id, cutoff, session_id, limit),
+    )
+
+    return [
+        {
+            "session_id": r["session_id"],
+            "project": r["project_path"],
+            count_key: r["shared"],
+            "first_seen": _format_timestamp(r["first_seen"]),
+            "last_seen": _format_timestamp(r["last_seen"]),
+        }
+        for r in rows
+    ]
+
+
+# Tool/command groups and thresholds for classify_sessions().
+# Thresholds derived from typical session patterns:
+# - Debugging: High error rate signals troubleshooting (>15% or 5+ errors)
+# - Development: Heavy editing indicates feature work (>30% edits or 3+ writes)
+# - Maintenance: Git/build focus without editing (>30% combined)
+# - Research: Mostly reading/searching codebase (>50% combined)
+# - Mixed: No dominant pattern, balanced activity
+SEARCH_TOOLS = frozenset({"Grep", "Glob", "WebSearch"})
+GIT_COMMANDS = frozenset({"git", "gh"})
+BUILD_COMMANDS = frozenset({"make", "cargo", "npm", "pytest"})
+
+DEBUGGING_ERROR_RATE = 0.15
+DEBUGGING_ERROR_COUNT = 5
+DEVELOPMENT_EDIT_RATE = 0.3
+DEVELOPMENT_WRITE_COUNT = 3
+MAINTENANCE_GIT_BUILD_RATE = 0.3
+RESEARCH_READ_SEARCH_RATE = 0.5
+
+
+def _sql_in_list(values: frozenset[str]) -> str:
+    """Render hardcoded string constants as a SQL IN list (sorted for stable SQL text)."""
+    return ", ".join(f"'{v}'" for v in sorted(values))
+
+
+# Per-session activity stats (including efficiency metrics for #79) and files
+# read multiple times per session, in a single statement. The multi-read CTE is
+# restricted to sessions passing the threshold, so no IN (...) list of session
+# IDs has to round-trip through Python. The project filter is expressed with
+# parameters rather than spliced in, so the SQL text is identical on every call.
+# Safe: the IN lists are built from the hardcoded constants above.
+_CLASSIFY_SESSIONS_SQL = f"""
+    WITH session_activity AS (
+        SELECT
+            session_id,
+            project_path,
+            COUNT(*) as total_events,
+            SUM(CASE WHEN tool_name = 'Edit' THEN 1 ELSE 0 END) as edit_count,
+            SUM(CASE WHEN tool_name = 'Read' THEN 1 ELSE 0 END) as read_count,
+            SUM(CASE WHEN tool_name = 'Write' THEN 1 ELSE 0 END) as write_count,
+            SUM(CASE WHEN tool_name IN ({_sql_in_list(SEARCH_TOOLS)}) THEN 1 ELSE 0 END) as search_count,
+            SUM(CASE WHEN tool_name = 'Bash' AND command IN ({_sql_in_list(GIT_COMMANDS)}) THEN 1 ELSE 0 END) as git_count,
+            SUM(CASE WHEN tool_name = 'Bash' AND command IN ({_sql_in_list(BUILD_COMMANDS)}) THEN 1 ELSE 0 END) as build_count,
+            SUM(CASE WHEN is_error = 1 THEN 1 ELSE 0 END) as error_count,
+            SUM(CASE WHEN entry_type = 'compaction' THEN 1 ELSE 0 END) as compaction_count,
+            COALESCE(SUM(result_size_bytes), 0) as total_result_bytes,
+            MIN(timestamp) as first_seen,
+            MAX(timestamp) as last_seen
+        FROM events
+        WHERE timestamp >= ?
+          AND (? IS NULL OR project_path LIKE ?)
+        GROUP BY session_id
+        HAVING COUNT(*) >= 5
+    ),
+    multi_reads AS (
+        SELECT session_id, COUNT(*) as multi_read_files
+        FROM (
+            SELECT session_id, file_path
+            FROM events
+            WHERE session_id IN (SELECT session_id FROM session_activity)
+              AND tool_name = 'Read'
+              AND file_path IS NOT NULL
+            GROUP BY session_id, file_path
+            HAVING COUNT(*) > 1
+        )
+        GROUP BY session_id
+    )
+    SELECT
+        session_activity.*,
+        COALESCE(multi_reads.multi_read_files, 0) as multi_read_files
+    FROM session_activity
+    LEFT JOIN multi_reads ON multi_reads.session_id = session_activity.session_id
+    ORDER BY session_activity.first_seen DESC
+"""
+
+
 def classify_sessions(
     storage: SQLiteStorage,
     days: int = 7,
@@ -1089,67 +1097,8 @@ def classify_sessions(
         - category_distribution: Count of sessions per category
     """
     cutoff = get_cutoff(days=days)
-
-    # Build where clause
-    where_parts = ["timestamp >= ?"]
-    params: list = [cutoff]
-
-    if project:
-        where_parts.append("project_path LIKE ?")
-        params.append(f"%{project}%")
-
-    where_clause = " AND ".join(where_parts)
-
-    # Get activity stats per session (including efficiency metrics for #79)
-    # Safe: where_clause is built from hardcoded condition strings above
-    rows = storage.execute_query(
-        f"""
-        SELECT
-            session_id,
-            project_path,
-            COUNT(*) as total_events,
-            SUM(CASE WHEN tool_name = 'Edit' THEN 1 ELSE 0 END) as edit_count,
-            SUM(CASE WHEN tool_name = 'Read' THEN 1 ELSE 0 END) as read_count,
-            SUM(CASE WHEN tool_name = 'Write' THEN 1 ELSE 0 END) as write_count,
-            SUM(CASE WHEN tool_name IN ('Grep', 'Glob', 'WebSearch') THEN 1 ELSE 0 END) as search_count,
-            SUM(CASE WHEN tool_name = 'Bash' AND command IN ('git', 'gh') THEN 1 ELSE 0 END) as git_count,
-            SUM(CASE WHEN tool_name = 'Bash' AND command IN ('make', 'cargo', 'npm', 'pytest') THEN 1 ELSE 0 END) as build_count,
-            SUM(CASE WHEN is_error = 1 THEN 1 ELSE 0 END) as error_count,
-            SUM(CASE WHEN entry_type = 'compaction' THEN 1 ELSE 0 END) as compaction_count,
-            COALESCE(SUM(result_size_bytes), 0) as total_result_bytes,
-            MIN(timestamp) as first_seen,
-            MAX(timestamp) as last_seen
-        FROM events
-        WHERE {where_clause}
-        GROUP BY session_id
-        HAVING COUNT(*) >= 5
-        ORDER BY first_seen DESC
-        """,
-        tuple(params),
-    )
-
-    # Get files read multiple times per session
-    session_ids = [row["session_id"] for row in rows]
-    files_read_multiple: dict[str, int] = {}
-    if session_ids:
-        placeholders = ",".join("?" * len(session_ids))
-        multi_read_rows = storage.execute_query(
-            f"""
-            SELECT session_id, COUNT(*) as multi_read_files
-            FROM (
-                SELECT session_id, file_path, COUNT(*) as read_count
-                FROM events
-                WHERE session_id IN ({placeholders})
-                  AND tool_name = 'Read'
-                  AND file_path IS NOT NULL
-                GROUP BY session_id, file_path
-                HAVING COUNT(*) > 1
-            )
-            GROUP BY session_id
-            """,
-            tuple(session_ids),
-        )
-        files_read_multiple = {r["session_id"]: r["multi_read_files"] for r in multi_read_rows}
+    project_pattern = f"%{project}%" if project else None
+    rows = storage.execute_query(_CLASSIFY_SESSIONS_SQL, (cutoff, project_pattern, project_pattern))
 
     classifications = []
     category_counts = {
@@ -1169,45 +1118,47 @@ def classify_sessions(
         build_pct = (row["build_count"] or 0) / total
         error_pct = (row["error_count"] or 0) / total
 
-        # Classification heuristics based on activity ratios
-        # Thresholds derived from typical session patterns:
-        # - Debugging: High error rate signals troubleshooting (>15% or 5+ errors)
-        # - Development: Heavy editing indicates feature work (>30% edits or 3+ writes)
-        # - Maintenance: Git/build focus without editing (>30% combined)
-        # - Research: Mostly reading/searching codebase (>50% combined)
-        # - Mixed: No dominant pattern, balanced activity
+        # Classification heuristics based on activity ratios (thresholds above)
         error_count = row["error_count"] or 0
         write_count = row["write_count"] or 0
 
-        if error_pct > 0.15 or error_count > 5:
+        if error_pct > DEBUGGING_ERROR_RATE or error_count > DEBUGGING_ERROR_COUNT:
             category = "debugging"
             confidence = min(1.0, error_pct * 3)
             classification_factors = {
-                "trigger": "error_rate > 15%" if error_pct > 0.15 else "error_count > 5",
+                "trigger": (
+                    f"error_rate > {DEBUGGING_ERROR_RATE:.0%}"
+                    if error_pct > DEBUGGING_ERROR_RATE
+                    else f"error_count > {DEBUGGING_ERROR_COUNT}"
+                ),
                 "error_rate": round(error_pct * 100, 1),
                 "error_count": error_count,
             }
-        elif edit_pct > 0.3 or write_count > 3:
+        elif edit_pct > DEVELOPMENT_EDIT_RATE or write_count > DEVELOPMENT_WRITE_COUNT:
             category = "development"
             confidence = min(1.0, (edit_pct + write_count / total) * 2)
             classification_factors = {
-                "trigger": "edit_rate > 30%" if edit_pct > 0.3 else "write_count > 3",
+                "trigger": (
+                    f"edit_rate > {DEVELOPMENT_EDIT_RATE:.0%}"
+                    if edit_pct > DEVELOPMENT_EDIT_RATE
+                    else f"write_count > {DEVELOPMENT_WRITE_COUNT}"
+                ),
                 "edit_rate": round(edit_pct * 100, 1),
                 "write_count": write_count,
             }
-        elif git_pct + build_pct > 0.3:
+        elif git_pct + build_pct > MAINTENANCE_GIT_BUILD_RATE:
             category = "maintenance"
             confidence = min(1.0, (git_pct + build_pct) * 2)
             classification_factors = {
-                "trigger": "git_build_rate > 30%",
+                "trigger": f"git_build_rate > {MAINTENANCE_GIT_BUILD_RATE:.0%}",
                 "git_rate": round(git_pct * 100, 1),
                 "build_rate": round(build_pct * 100, 1),
             }
-        elif read_pct + search_pct > 0.5:
+        elif read_pct + search_pct > RESEARCH_READ_SEARCH_RATE:
             category = "research"
             confidence = min(1.0, (read_pct + search_pct) * 1.5)
             classification_factors = {
-                "trigger": "read_search_rate > 50%",
+                "trigger": f"read_search_rate > {RESEARCH_READ_SEARCH_RATE:.0%}",
                 "read_rate": round(read_pct * 100, 1),
                 "search_rate": round(search_pct * 100, 1),
             }
@@ -1228,7 +1179,7 @@ def classify_sessions(
         # Issue #79: Add efficiency metrics
         compaction_count = row["compaction_count"] or 0
         total_bytes = row["total_result_bytes"] or 0
-        multi_read_files = files_read_multiple.get(row["session_id"], 0)
+        multi_read_files = row["multi_read_files"]
 
         # Calculate burn_rate based on compactions per hour
         first_seen = row["first_seen"]
@@ -1336,30 +1287,67 @@ def get_handoff_context(
             }
         session_id = recent[0]["session_id"]
 
-    # Get session boundaries
-    session_info = storage.execute_query(
+    # One pass over the session's events: a summary row plus the top-N files,
+    # commands, tools and latest user messages, tagged by kind and ranked within it.
+    rows = storage.execute_query(
         """
-        SELECT
-            MIN(timestamp) as first_seen,
-            MAX(timestamp) as last_seen,
-            COUNT(*) as total_events,
-            project_path
-        FROM events
-        WHERE session_id = ?
+        WITH session_events AS (
+            SELECT session_id, timestamp, entry_type, message_text, file_path, tool_name,
+                   command, project_path
+            FROM events
+            WHERE session_id = ?
+        ),
+        ranked AS (
+            SELECT 'file' as kind, file_path as name, COUNT(*) as n, NULL as ts,
+                   ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC) as rank
+            FROM session_events
+            WHERE file_path IS NOT NULL AND tool_name IN ('Edit', 'Write')
+            GROUP BY file_path
+            UNION ALL
+            SELECT 'command', command, COUNT(*), NULL,
+                   ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC)
+            FROM session_events
+            WHERE command IS NOT NULL
+            GROUP BY command
+            UNION ALL
+            SELECT 'tool', tool_name, COUNT(*), NULL,
+                   ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC)
+            FROM session_events
+            WHERE tool_name IS NOT NULL
+            GROUP BY tool_name
+            UNION ALL
+            SELECT 'message', message_text, NULL, timestamp,
+                   ROW_NUMBER() OVER (ORDER BY timestamp DESC)
+            FROM session_events
+            WHERE entry_type = 'user' AND message_text IS NOT NULL
+        )
+        SELECT 'info' as kind, project_path as name, COUNT(*) as n,
+               MIN(timestamp) as ts, MAX(timestamp) as last_ts, 0 as rank
+        FROM session_events
         GROUP BY session_id
+        UNION ALL
+        SELECT kind, name, n, ts, NULL, rank
+        FROM ranked
+        -- A negative message_limit means no limit, as it did with LIMIT ?
+        WHERE CASE kind WHEN 'message' THEN ? < 0 OR rank <= ? ELSE rank <= 10 END
+        ORDER BY kind, rank
         """,
-        (session_id,),
+        (session_id, message_limit, message_limit),
     )
 
-    if not session_info:
+    by_kind: dict[str, list] = {}
+    for row in rows:
+        by_kind.setdefault(row["kind"], []).append(row)
+
+    if "info" not in by_kind:
         return {
             "error": f"Session not found: {session_id}",
             "session_id": session_id,
         }
 
-    info = session_info[0]
-    first_seen = info["first_seen"]
-    last_seen = info["last_seen"]
+    info = by_kind["info"][0]
+    first_seen = info["ts"]
+    last_seen = info["last_ts"]
     if isinstance(first_seen, str):
         first_seen = datetime.fromisoformat(first_seen)
     if isinstance(last_seen, str):
@@ -1369,84 +1357,24 @@ def get_handoff_context(
         int((last_seen - first_seen).total_seconds() / 60) if last_seen and first_seen else 0
     )
 
-    # Get recent user messages
-    messages = storage.execute_query(
-        """
-        SELECT timestamp, message_text
-        FROM events
-        WHERE session_id = ?
-          AND entry_type = 'user'
-          AND message_text IS NOT NULL
-        ORDER BY timestamp DESC
-        LIMIT ?
-        """,
-        (session_id, message_limit),
-    )
-
     recent_messages = [
         {
-            "timestamp": _format_timestamp(m["timestamp"]),
-            "message": m["message_text"][:200] if m["message_text"] else None,
+            "timestamp": _format_timestamp(m["ts"]),
+            "message": m["name"][:200] if m["name"] else None,
         }
-        for m in messages
+        for m in by_kind.get("message", [])
     ]
-
-    # Get files modified
-    files = storage.execute_query(
-        """
-        SELECT DISTINCT file_path, COUNT(*) as touch_count
-        FROM events
-        WHERE session_id = ?
-          AND file_path IS NOT NULL
-          AND tool_name IN ('Edit', 'Write')
-        GROUP BY file_path
-        ORDER BY touch_count DESC
-        LIMIT 10
-        """,
-        (session_id,),
-    )
-
-    modified_files = [{"file": f["file_path"], "touches": f["touch_count"]} for f in files]
-
-    # Get commands run
-    commands = storage.execute_query(
-        """
-        SELECT command, COUNT(*) as run_count
-        FROM events
-        WHERE session_id = ?
-          AND command IS NOT NULL
-        GROUP BY command
-        ORDER BY run_count DESC
-        LIMIT 10
-        """,
-        (session_id,),
-    )
-
-    recent_commands = [{"command": c["command"], "count": c["run_count"]} for c in commands]
-
-    # Get tool usage summary
-    tools = storage.execute_query(
-        """
-        SELECT tool_name, COUNT(*) as use_count
-        FROM events
-        WHERE session_id = ?
-          AND tool_name IS NOT NULL
-        GROUP BY tool_name
-        ORDER BY use_count DESC
-        LIMIT 10
-        """,
-        (session_id,),
-    )
-
-    tool_summary = [{"tool": t["tool_name"], "count": t["use_count"]} for t in tools]
+    modified_files = [{"file": f["name"], "touches": f["n"]} for f in by_kind.get("file", [])]
+    recent_commands = [{"command": c["name"], "count": c["n"]} for c in by_kind.get("command", [])]
+    tool_summary = [{"tool": t["name"], "count": t["n"]} for t in by_kind.get("tool", [])]
 
     return {
         "session_id": session_id,
-        "project": info["project_path"],
+        "project": info["name"],
         "first_seen": _format_timestamp(first_seen),
         "last_seen": _format_timestamp(last_seen),
         "duration_minutes": duration_minutes,
-        "total_events": info["total_events"],
+        "total_events": info["n"],
         "recent_messages": recent_messages,
         "modified_files": modified_files,
         "recent_commands": recent_commands,
@@ -1458,6 +1386,10 @@ def get_handoff_context(
 WORKTREE_PATTERN = re.compile(r"\.worktrees/[^/]+/")
 
 
+# File tool -> per-file counter it increments in query_file_activity()
+_FILE_TOOL_COUNTERS = {"Read": "reads", "Edit": "edits", "Write": "writes"}
+
+
 def _collapse_worktree_path(path: str) -> str:
     """Remove .worktrees/<branch>/ from a path to consolidate file activity."""
     return WORKTREE_PATTERN.sub("", path)
@@ -1510,18 +1442,13 @@ def query_file_activity(
         if collapse_worktrees:
             path = _collapse_worktree_path(path)
 
-        if path not in file_stats:
-            file_stats[path] = {"reads": 0, "edits": 0, "writes": 0, "total": 0}
+        stats = file_stats.get(path)
+        if stats is None:
+            stats = file_stats[path] = {"reads": 0, "edits": 0, "writes": 0, "total": 0}
 
-        tool = row["tool_name"]
         count = row["count"]
-        if tool == "Read":
-            file_stats[path]["reads"] += count
-        elif tool == "Edit":
-            file_stats[path]["edits"] += count
-        elif tool == "Write":
-            file_stats[path]["writes"] += count
-        file_stats[path]["total"] += count
+        stats[_FILE_TOOL_COUNTERS[row["tool_name"]]] += count
+        stats["total"] += count
 
     # Sort by total and limit
     sorted_files = sorted(file_stats.items(), key=lambda x: x[1]["total"], reverse=True)[:limit]
@@ -1545,6 +1472,35 @@ def query_file_activity(
     }
 
 
+# File extension (lowercase, without the dot) -> language for query_languages()
+_EXTENSION_LANGUAGES = {
+    "rs": "Rust",
+    "py": "Python",
+    "ts": "TypeScript",
+    "tsx": "TypeScript",
+    "js": "JavaScript",
+    "jsx": "JavaScript",
+    "md": "Markdown",
+    "json": "JSON",
+    "toml": "TOML",
+    "yaml": "YAML",
+    "yml": "YAML",
+    "sh": "Shell",
+    "bash": "Shell",
+    "go": "Go",
+    "java": "Java",
+    "rb": "Ruby",
+    "c": "C",
+    "cpp": "C++",
+    "h": "C/C++ Header",
+    "hpp": "C++ Header",
+    "swift": "Swift",
+    "css": "CSS",
+    "html": "HTML",
+    "sql": "SQL",
+}
+
+
 def query_languages(
     storage: SQLiteStorage,
     days: int = 7,
@@ -1567,53 +1523,45 @@ def query_languages(
         extra_conditions=["tool_name IN ('Read', 'Edit', 'Write')", "file_path IS NOT NULL"],
     )
 
+    # Group by lowercased extension in SQL, then map the handful of distinct
+    # extensions to languages in Python. This replaces a per-row CASE chain of
+    # LIKE comparisons with one dict lookup per group. The extension is taken
+    # from the basename only, so extensionless files (Makefile, paths under
+    # dotted directories) all collapse into a single '' group instead of one
+    # group per distinct path.
     rows = storage.execute_query(
         f"""
         SELECT
             CASE
-                WHEN file_path LIKE '%.rs' THEN 'Rust'
-                WHEN file_path LIKE '%.py' THEN 'Python'
-                WHEN file_path LIKE '%.ts' THEN 'TypeScript'
-                WHEN file_path LIKE '%.tsx' THEN 'TypeScript'
-                WHEN file_path LIKE '%.js' THEN 'JavaScript'
-                WHEN file_path LIKE '%.jsx' THEN 'JavaScript'
-                WHEN file_path LIKE '%.md' THEN 'Markdown'
-                WHEN file_path LIKE '%.json' THEN 'JSON'
-                WHEN file_path LIKE '%.toml' THEN 'TOML'
-                WHEN file_path LIKE '%.yaml' THEN 'YAML'
-                WHEN file_path LIKE '%.yml' THEN 'YAML'
-                WHEN file_path LIKE '%.sh' THEN 'Shell'
-                WHEN file_path LIKE '%.bash' THEN 'Shell'
-                WHEN file_path LIKE '%.go' THEN 'Go'
-                WHEN file_path LIKE '%.java' THEN 'Java'
-                WHEN file_path LIKE '%.rb' THEN 'Ruby'
-                WHEN file_path LIKE '%.c' THEN 'C'
-                WHEN file_path LIKE '%.cpp' THEN 'C++'
-                WHEN file_path LIKE '%.h' THEN 'C/C++ Header'
-                WHEN file_path LIKE '%.hpp' THEN 'C++ Header'
-                WHEN file_path LIKE '%.swift' THEN 'Swift'
-                WHEN file_path LIKE '%.css' THEN 'CSS'
-                WHEN file_path LIKE '%.html' THEN 'HTML'
-                WHEN file_path LIKE '%.sql' THEN 'SQL'
-                ELSE 'Other'
-            END as language,
+                WHEN instr(basename, '.') > 0
+                THEN lower(substr(basename, length(rtrim(basename, replace(basename, '.', ''))) + 1))
+                ELSE ''
+            END as extension,
             COUNT(*) as count
-        FROM events
-        WHERE {where_clause}
-        GROUP BY language
-        ORDER BY count DESC
+        FROM (
+            SELECT substr(file_path, length(rtrim(file_path, replace(file_path, '/', ''))) + 1)
+                as basename
+            FROM events
+            WHERE {where_clause}
+        )
+        GROUP BY extension
         """,
         params,
     )
 
-    total = sum(row["count"] for row in rows)
+    counts: dict[str, int] = {}
+    for row in rows:
+        language = _EXTENSION_LANGUAGES.get(row["extension"], "Other")
+        counts[language] = counts.get(language, 0) + row["count"]
+
+    total = sum(counts.values())
     languages = [
         {
-            "language": row["language"],
-            "count": row["count"],
-            "percent": round(row["count"] / total * 100, 1) if total > 0 else 0,
+            "language": language,
+            "count": count,
+            "percent": round(count / total * 100, 1) if total > 0 else 0,
         }
-        for row in rows
+        for language, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)
     ]
 
     return {
@@ -1704,58 +1652,46 @@ def query_mcp_usage(
     where_clause, params = build_where_clause(
         cutoff=cutoff,
         project=project,
-        extra_conditions=["tool_name LIKE 'mcp__%'"],
+        extra_conditions=[_MCP_TOOL_RANGE],
     )
 
+    # Parse mcp__<server>__<tool> and aggregate per (server, tool) in SQL. The
+    # tool part keeps any further "__" in its name; names without a second
+    # separator are reported under server "unknown" with the full tool name.
+    # Rows arrive ordered by server total, then tool count.
     rows = storage.execute_query(
         f"""
         SELECT
-            tool_name,
-            COUNT(*) as count
-        FROM events
-        WHERE {where_clause}
-        GROUP BY tool_name
-        ORDER BY count DESC
+            server,
+            tool,
+            count,
+            SUM(count) OVER (PARTITION BY server) as server_total
+        FROM (
+            SELECT
+                CASE WHEN sep > 0 THEN substr(rest, 1, sep - 1) ELSE 'unknown' END as server,
+                CASE WHEN sep > 0 THEN substr(rest, sep + 2) ELSE tool_name END as tool,
+                COUNT(*) as count
+            FROM (
+                SELECT tool_name, substr(tool_name, 6) as rest, instr(substr(tool_name, 6), '__') as sep
+                FROM events
+                WHERE {where_clause}
+            )
+            GROUP BY server, tool
+        )
+        ORDER BY server_total DESC, server, count DESC
         """,
         params,
     )
 
-    # Group by server (extract from mcp__<server>__<tool>)
     servers: dict[str, dict] = {}
-    total = 0
-
     for row in rows:
-        tool_name = row["tool_name"]
-        count = row["count"]
-        total += count
-
-        # Parse mcp__<server>__<tool>
-        parts = tool_name.split("__")
-        if len(parts) >= 3:
-            server = parts[1]
-            tool = "__".join(parts[2:])  # Handle tools with __ in name
-        else:
-            server = "unknown"
-            tool = tool_name
-
-        if server not in servers:
-            servers[server] = {"total": 0, "tools": []}
-
-        servers[server]["total"] += count
-        servers[server]["tools"].append({"tool": tool, "count": count})
-
-    # Sort servers by total and tools by count
-    server_list = sorted(servers.items(), key=lambda x: x[1]["total"], reverse=True)
-    result_servers = []
-    for server_name, data in server_list:
-        data["tools"].sort(key=lambda x: x["count"], reverse=True)
-        result_servers.append(
-            {
-                "server": server_name,
-                "total": data["total"],
-                "tools": data["tools"],
-            }
+        server = servers.setdefault(
+            row["server"], {"server": row["server"], "total": row["server_total"], "tools": []}
         )
+        server["tools"].append({"tool": row["tool"], "count": row["count"]})
+
+    total = sum(server["total"] for server in servers.values())
+    result_servers = list(servers.values())
 
     return {
         "days": days,
@@ -1768,6 +1704,7 @@ def query_agent_activity(
     storage: SQLiteStorage,
     days: int = 7,
     project: str | None = None,
+    now: datetime | None = None,
 ) -> dict:
     """Query activity breakdown by Task subagent.
 
@@ -1778,6 +1715,7 @@ def query_agent_activity(
         storage: Storage instance
         days: Number of days to analyze
         project: Optional project path filter
+        now: Reference time for the window (default: current time)
 
     Returns:
         Dict with agent activity breakdown including:
@@ -1785,7 +1723,7 @@ def query_agent_activity(
         - Per-agent stats (agent_id IS NOT NULL)
         - Token usage, event counts, tool usage per agent
     """
-    cutoff = get_cutoff(days=days)
+    cutoff = get_cutoff(days=days, now=now)
     where_clause, params = build_where_clause(
         cutoff=cutoff,
         project=project,
@@ -1833,34 +1771,38 @@ def query_agent_activity(
         else:
             agents.append(agent_data)
 
-    # Get top tools per agent (for agents with activity)
-    agent_ids = [a["agent_id"] for a in agents]
-    if agent_ids:
-        placeholders = ",".join(["?"] * len(agent_ids))
+    # Get top 5 tools per agent. Every non-NULL agent_id under the same filters is
+    # in `agents`, so the agent set is expressed in SQL rather than as an IN list,
+    # and the per-agent cap is applied by a window function before rows reach Python.
+    if agents:
         tool_rows = storage.execute_query(
             f"""
-            SELECT
-                agent_id,
-                tool_name,
-                COUNT(*) as count
-            FROM events
-            WHERE {where_clause}
-              AND agent_id IN ({placeholders})
-              AND tool_name IS NOT NULL
-            GROUP BY agent_id, tool_name
-            ORDER BY agent_id, count DESC
+            SELECT agent_id, tool_name, count
+            FROM (
+                SELECT
+                    agent_id,
+                    tool_name,
+                    COUNT(*) as count,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY agent_id ORDER BY COUNT(*) DESC
+                    ) as tool_rank
+                FROM events
+                WHERE {where_clause}
+                  AND agent_id IS NOT NULL
+                  AND tool_name IS NOT NULL
+                GROUP BY agent_id, tool_name
+            )
+            WHERE tool_rank <= 5
+            ORDER BY agent_id, tool_rank
             """,
-            params + agent_ids,
+            params,
         )
 
-        # Group top 5 tools per agent
         agent_tools: dict[str, list] = {}
         for row in tool_rows:
-            aid = row["agent_id"]
-            if aid not in agent_tools:
-                agent_tools[aid] = []
-            if len(agent_tools[aid]) < 5:
-                agent_tools[aid].append({"tool": row["tool_name"], "count": row["count"]})
+            agent_tools.setdefault(row["agent_id"], []).append(
+                {"tool": row["tool_name"], "count": row["count"]}
+            )
 
         # Attach tools to agents
         for agent in agents:
@@ -1990,6 +1932,7 @@ def query_error_details(
     days: int = 7,
     tool: str | None = None,
     limit: int = 50,
+    now: datetime | None = None,
 ) -> dict:
     """Get detailed error information including tool parameters that caused failures.
 
@@ -2002,12 +1945,12 @@ def query_error_details(
         days: Number of days to analyze (default: 7)
         tool: Optional filter by tool name (e.g., "Glob", "Bash")
         limit: Maximum errors to return per tool (default: 50)
+        now: Reference time for the window (default: current time)
 
     Returns:
         Dict with error details grouped by tool and parameter
     """
-    cutoff = get_cutoff(days=days)
-
+    cutoff = get_cutoff(days=days, now=now)
     # Build tool filter
     tool_filter = ""
     params: list = [cutoff]
@@ -2015,29 +1958,44 @@ def query_error_details(
         tool_filter = "AND e2.tool_name = ?"
         params.append(tool)
 
+    params.append(limit)
+
     # Query errors with tool parameters
     # Uses json_extract to get the relevant parameter based on tool type:
     # - Glob/Grep: pattern
     # - Bash: command (already extracted to column)
     # - Read/Edit/Write: file_path (already extracted to column)
+    # The (few) error results are read from idx_events_error_results and each is
+    # matched to its tool_use by tool_id.
+    # Groups are ranked and capped per tool in SQL; the per-tool total is a window
+    # sum over all groups, so tool_totals still counts the groups cut by the limit.
     rows = storage.execute_query(
         f"""
-        SELECT
-            e2.tool_name,
-            e2.command,
-            e2.file_path,
-            json_extract(e2.tool_input_json, '$.pattern') as pattern,
-            json_extract(e2.tool_input_json, '$.path') as search_path,
-            e1.project_path,
-            COUNT(*) as error_count
-        FROM events e1
-        JOIN events e2 ON e1.tool_id = e2.tool_id AND e2.entry_type = 'tool_use'
-        WHERE e1.timestamp >= ?
-          AND e1.is_error = 1
-          AND e1.entry_type = 'tool_result'
-          {tool_filter}
-        GROUP BY e2.tool_name, e2.command, e2.file_path, pattern, search_path, e1.project_path
-        ORDER BY e2.tool_name, error_count DESC
+        SELECT * FROM (
+            SELECT
+                e2.tool_name,
+                e2.command,
+                e2.file_path,
+                json_extract(e2.tool_input_json, '$.pattern') as pattern,
+                json_extract(e2.tool_input_json, '$.path') as search_path,
+                e1.project_path,
+                COUNT(*) as error_count,
+                SUM(COUNT(*)) OVER (PARTITION BY e2.tool_name) as tool_total,
+                ROW_NUMBER() OVER (
+                    PARTITION BY e2.tool_name ORDER BY COUNT(*) DESC
+                ) as rank
+            FROM events e1
+            JOIN events e2 ON e1.tool_id = e2.tool_id AND e2.entry_type = 'tool_use'
+            WHERE e1.timestamp >= ?
+              AND e1.is_error = 1
+              AND e1.entry_type = 'tool_result'
+              AND e2.tool_name IS NOT NULL
+              {tool_filter}
+            GROUP BY e2.tool_name, e2.command, e2.file_path, pattern, search_path,
+                     e1.project_path
+        )
+        WHERE rank <= MAX(?, 1)
+        ORDER BY tool_name, rank
         """,
         tuple(params),
     )
@@ -2048,8 +2006,6 @@ def query_error_details(
 
     for row in rows:
         tool_name = row["tool_name"]
-        if not tool_name:
-            continue
 
         # Determine the key parameter based on tool type
         if tool_name in ("Glob", "Grep"):
@@ -2062,25 +2018,23 @@ def query_error_details(
             key_param = row["file_path"]
             param_type = "file_path"
 
-        if tool_name not in errors_by_tool:
-            errors_by_tool[tool_name] = []
-            tool_totals[tool_name] = 0
-
-        tool_totals[tool_name] += row["error_count"]
+        tool_totals[tool_name] = row["tool_total"]
+        errors_by_tool.setdefault(tool_name, [])
+        # The top-ranked row is always returned so limit=0 still reports totals
+        if row["rank"] > limit:
+            continue
 
-        # Only keep top N per tool
-        if len(errors_by_tool[tool_name]) < limit:
-            error_detail = {
-                "param_type": param_type,
-                "param_value": key_param,
-                "error_count": row["error_count"],
-                "project": row["project_path"],
-            }
-            # Add search_path for Glob/Grep if present
-            if tool_name in ("Glob", "Grep") and row["search_path"]:
-                error_detail["search_path"] = row["search_path"]
+        error_detail = {
+            "param_type": param_type,
+            "param_value": key_param,
+            "error_count": row["error_count"],
+            "project": row["project_path"],
+        }
+        # Add search_path for Glob/Grep if present
+        if tool_name in ("Glob", "Grep") and row["search_path"]:
+            error_detail["search_path"] = row["search_path"]
 
-            errors_by_tool[tool_name].append(error_detail)
+        errors_by_tool[tool_name].append(error_detail)
 
     return {
         "days": days,
@@ -7,7 +7,7 @@ import logging
 import os
 import sqlite3
 from contextlib import contextmanager
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 from pathlib import Path
 
@@ -30,7 +30,7 @@ sqlite3.register_adapter(datetime, _adapt_datetime)
 sqlite3.register_converter("TIMESTAMP", _convert_datetime)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Event:
     """A parsed event from a Claude Code session log."""
 
@@ -174,7 +174,7 @@ class BusEvent:
 DEFAULT_DB_PATH = Path.home() / ".claude" / "contrib" / "analytics" / "data.db"
 
 # Schema version for migrations
-SCHEMA_VERSION = 12
+SCHEMA_VERSION = 19
 
 # Migration functions: dict of version -> (migration_name, migration_func)
 # Each migration upgrades FROM version-1 TO version
@@ -588,32 +588,163 @@ def migrate_v12(conn):
     logger.info(f"Fixed {warmup_count} warmup events from is_error=1 to is_error=0")
 
 
+@migration(13, "replace_session_index_with_session_timestamp")
+def migrate_v13(conn):
+    """Replace idx_events_session(session_id) with (session_id, timestamp).
+
+    classify_sessions(), get_user_journey(), query_agent_activity() and the
+    session drill-downs filter or group by session and then order by time.
+    The composite index serves those scans in time order without a separate
+    sort per session. It still serves plain session_id lookups, which makes
+    the old single-column index redundant.
+    """
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_session_timestamp ON events(session_id, timestamp)"
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_events_session")
+
+
+@migration(14, "add_error_results_index")
+def migrate_v14(conn):
+    """Add partial index over failed events by (entry_type, timestamp).
+
+    query_error_details() and the failure analysis in patterns.py start from
+    tool_result rows with is_error = 1 inside the time window, then join to the
+    matching tool_use by tool_id. Errors are a small fraction of events, so a
+    partial index lets those queries read just the failures instead of every
+    event in the window. Leading with entry_type gives the planner the same
+    two-column seek it has on idx_events_entry_type_timestamp, over a far
+    smaller range, so the joins pick it up without INDEXED BY hints.
+    """
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_error_results
+        ON events(entry_type, timestamp) WHERE is_error = 1
+        """
+    )
+
+
+@migration(15, "add_agent_tools_index")
+def migrate_v15(conn):
+    """Add covering partial index for per-agent tool counts.
+
+    query_agent_activity() ranks each subagent's tools by grouping on
+    (agent_id, tool_name) over the window. Only subagent tool calls qualify, so a
+    partial index ordered by those columns, and carrying timestamp and
+    project_path for the filters, answers the grouping without touching the
+    table.
+    """
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_agent_tools
+        ON events(agent_id, tool_name, timestamp, project_path)
+        WHERE agent_id IS NOT NULL AND tool_name IS NOT NULL
+        """
+    )
+
+
+@migration(16, "add_sessions_last_seen_index")
+def migrate_v16(conn):
+    """Add index on sessions.last_seen.
+
+    query_sessions() filters sessions by last_seen >= cutoff and orders by
+    last_seen DESC; without an index every session row is read and sorted.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions(last_seen)")
+
+
+@migration(17, "replace_tool_index_with_tool_timestamp")
+def migrate_v17(conn):
+    """Replace idx_events_tool(tool_name) with (tool_name, timestamp).
+
+    query_timeline(tool=...) filters by tool and time and returns the newest
+    rows first; the composite index serves that range in order, so the LIMIT
+    stops the scan early instead of sorting every matching event. It still
+    serves plain tool_name lookups, which makes the old single-column index
+    redundant.
+    """
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_tool_timestamp ON events(tool_name, timestamp)"
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_events_tool")
+
+
+@migration(18, "add_entry_type_timestamp_index")
+def migrate_v18(conn):
+    """Add composite index on (entry_type, timestamp).
+
+    Compaction, journey and token queries filter on an entry type inside a time
+    window. Rare types such as 'compaction' or 'user' otherwise cost a scan of
+    every event in the window; the composite index reads just that type's range.
+    """
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_entry_type_timestamp "
+        "ON events(entry_type, timestamp)"
+    )
+
+
+@migration(19, "add_file_activity_index")
+def migrate_v19(conn):
+    """Add covering partial index for per-file Read/Edit/Write counts.
+
+    File activity and language breakdowns group file-tool calls by file_path
+    inside a time window. Covering the path (and project_path for the project
+    filter) answers them from the index without visiting the events rows.
+    """
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_file_activity
+        ON events(tool_name, timestamp, file_path, project_path)
+        WHERE file_path IS NOT NULL
+        """
+    )
+
+
 class SQLiteStorage:
     """SQLite-backed storage for session analytics."""
 
     def __init__(self, db_path: str | Path | None = None):
-        """Initialize storage with optional custom DB path."""
+        """Initialize storage with optional custom DB path.
+
+        Pass ":memory:" for a private in-memory database (used by tests). An
+        in-memory database only lives as long as its connection, so such an
+        instance keeps one connection open and reuses it for every operation.
+        """
         if db_path is None:
             db_path = os.environ.get("SESSION_ANALYTICS_DB", str(DEFAULT_DB_PATH))
 
         self.db_path = Path(db_path)
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._memory_conn: sqlite3.Connection | None = None
+        if str(db_path) == ":memory:":
+            self._memory_conn = self._open(check_same_thread=False)
+        else:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
         self._init_db()
 
-    @contextmanager
-    def _connect(self):
-        """Context manager for database connections."""
+    def _open(self, **kwargs) -> sqlite3.Connection:
+        """Open a new connection to this storage's database."""
         conn = sqlite3.connect(
             self.db_path,
             detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            **kwargs,
         )
         conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _connect(self):
+        """Context manager for database connections."""
+        conn = self._memory_conn or self._open()
         try:
             yield conn
             conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
         finally:
-            conn.close()
+            if conn is not self._memory_conn:
+                conn.close()
 
     def execute_query(self, sql: str, params: tuple | list = ()) -> list[sqlite3.Row]:
         """Execute a SQL query and return all results.
@@ -663,6 +794,18 @@ class SQLiteStorage:
             cursor = conn.executemany(sql, params_seq)
             return cursor.rowcount
 
+    def copy_from(self, other: SQLiteStorage) -> None:
+        """Replace this database's contents with a copy of another storage's.
+
+        Uses SQLite's online backup, so tables, indexes, FTS and triggers come
+        across as they are, without rebuilding the schema.
+
+        Args:
+            other: Storage to copy from
+        """
+        with other._connect() as source, self._connect() as target:
+            source.backup(target)
+
     def _get_schema_version(self, conn: sqlite3.Connection) -> int:
         """Get current schema version from database."""
         try:
@@ -746,8 +889,10 @@ class SQLiteStorage:
 
             # Indexes for common queries (columns that exist in initial schema)
             conn.execute("CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_session ON events(session_id)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_tool ON events(tool_name)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_events_tool_timestamp "
+                "ON events(tool_name, timestamp)"
+            )
             conn.execute("CREATE INDEX IF NOT EXISTS idx_events_project ON events(project_path)")
 
             # Sessions metadata
@@ -877,6 +1022,41 @@ class SQLiteStorage:
             # Performance index for tool_use ↔ tool_result self-joins (migration v7)
             conn.execute("CREATE INDEX IF NOT EXISTS idx_events_tool_id ON events(tool_id)")
 
+            # Per-session time-ordered scans (migration v13)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_events_session_timestamp "
+                "ON events(session_id, timestamp)"
+            )
+
+            # Failed tool results for error drill-down joins (migration v14)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_events_error_results
+                ON events(entry_type, timestamp) WHERE is_error = 1
+            """)
+
+            # Covering index for per-agent tool counts (migration v15)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_events_agent_tools
+                ON events(agent_id, tool_name, timestamp, project_path)
+                WHERE agent_id IS NOT NULL AND tool_name IS NOT NULL
+            """)
+
+            # Entry type within a time window (migration v18)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_events_entry_type_timestamp "
+                "ON events(entry_type, timestamp)"
+            )
+
+            # Covering index for per-file tool counts (migration v19)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_events_file_activity
+                ON events(tool_name, timestamp, file_path, project_path)
+                WHERE file_path IS NOT NULL
+            """)
+
+            # Session time-range filter and ordering (migration v16)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions(last_seen)")
+
             # FTS5 full-text search on message_text (Issue #68: unified text for all entry types)
             # Run AFTER migrations so message_text column exists on both fresh and migrated DBs
             conn.execute("""
@@ -925,7 +1105,7 @@ class SQLiteStorage:
     # Event operations
 
     def add_event(self, event: Event) -> Event:
-        """Add a new event and return it with assigned ID."""
+        """Add a new event and return a copy of it with the assigned ID."""
         with self._connect() as conn:
             cursor = conn.execute(
                 """
@@ -969,11 +1149,15 @@ class SQLiteStorage:
                     event.result_size_bytes,
                 ),
             )
-            event.id = cursor.lastrowid
-            return event
+            return replace(event, id=cursor.lastrowid)
 
     def add_events_batch(self, events: list[Event]) -> int:
-        """Add multiple events in a single transaction. Returns count added."""
+        """Add multiple events in a single transaction. Returns count added.
+
+        Rows are streamed to executemany() from a generator rather than first
+        materialized as a list of tuples, so large ingest batches are not held
+        in memory twice.
+        """
         with self._connect() as conn:
             cursor = conn.executemany(
                 """
@@ -986,7 +1170,7 @@ class SQLiteStorage:
                     parent_uuid, agent_id, is_sidechain, version, result_size_bytes
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                [
+                (
                     (
                         e.uuid,
                         e.timestamp,
@@ -1018,7 +1202,7 @@ class SQLiteStorage:
                         e.result_size_bytes,
                     )
                     for e in events
-                ],
+                ),
             )
             return cursor.rowcount
 
@@ -1038,41 +1222,40 @@ class SQLiteStorage:
         limit: int = 100,
     ) -> list[Event]:
         """Get events within a time range with optional filters."""
-        with self._connect() as conn:
-            conditions = []
-            params: list = []
-
-            if start:
-                conditions.append("timestamp >= ?")
-                params.append(start)
-            if end:
-                conditions.append("timestamp <= ?")
-                params.append(end)
-            if tool_name:
-                conditions.append("tool_name = ?")
-                params.append(tool_name)
-            if project_path:
-                conditions.append("project_path = ?")
-                params.append(project_path)
-            if session_id:
-                conditions.append("session_id = ?")
-                params.append(session_id)
-
-            # Safe: where_clause is built from hardcoded condition strings, not user input
-            where_clause = " AND ".join(conditions) if conditions else "1=1"
-            params.append(limit)
-
-            rows = conn.execute(
-                f"""
-                SELECT * FROM events
-                WHERE {where_clause}
-                ORDER BY timestamp DESC
-                LIMIT ?
-                """,
-                params,
-            ).fetchall()
+        conditions = []
+        params: list = []
+
+        if start:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            conditions.append("timestamp <= ?")
+            params.append(end)
+        if tool_name:
+            conditions.append("tool_name = ?")
+            params.append(tool_name)
+        if project_path:
+            conditions.append("project_path = ?")
+            params.append(project_path)
+        if session_id:
+            conditions.append("session_id = ?")
+            params.append(session_id)
+
+        # Safe: where_clause is built from hardcoded condition strings, not user input
+        where_clause = " AND ".join(conditions) if conditions else "1=1"
+        params.append(limit)
+
+        rows = self.execute_query(
+            f"""
+            SELECT * FROM events
+            WHERE {where_clause}
+            ORDER BY timestamp DESC
+            LIMIT ?
+            """,
+            params,
+        )
 
-            return [self._row_to_event(row) for row in rows]
+        return [self._row_to_event(row) for row in rows]
 
     def _row_to_event(self, row: sqlite3.Row) -> Event:
         """Convert a database row to an Event object."""
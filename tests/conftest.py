@@ -1,24 +1,69 @@
 """Pytest configuration and shared fixtures."""
 
-import tempfile
+import os
 from datetime import datetime, timedelta
-from pathlib import Path
 
 import pytest
 
 from session_analytics.storage import Event, Session, SQLiteStorage
 
+# The MCP server creates its module-level SQLiteStorage() from this variable at
+# import time. Point it at an in-memory database so server tests never write to
+# the real analytics DB (set before any test module imports the server).
+os.environ["SESSION_ANALYTICS_DB"] = ":memory:"
+
+
+class _TemplateCopyStorage(SQLiteStorage):
+    """In-memory storage that starts as a copy of an already migrated one.
+
+    Building the schema costs a few milliseconds per instance; copying the
+    finished database with backup() skips that for every test.
+    """
+
+    def __init__(self, template: SQLiteStorage):
+        self._template = template
+        super().__init__(":memory:")
+
+    def _init_db(self):
+        self.copy_from(self._template)
+
+
+@pytest.fixture(autouse=True)
+def logs_dir(tmp_path, monkeypatch):
+    """Empty Claude Code logs directory standing in for ~/.claude/projects.
+
+    Server endpoints and ensure_fresh_data() ingest from DEFAULT_LOGS_DIR when
+    their storage looks stale; this keeps every test off the developer's real
+    logs. Write project directories into it to give a test logs to ingest.
+    """
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    monkeypatch.setattr("session_analytics.ingest.DEFAULT_LOGS_DIR", logs)
+    return logs
+
+
+@pytest.fixture(scope="session")
+def schema_template():
+    """Empty, fully migrated in-memory database that `storage` copies from."""
+    return SQLiteStorage(":memory:")
+
 
 @pytest.fixture
-def storage():
+def storage(schema_template):
     """Create a temporary storage instance for testing.
 
     This is the base fixture for all storage-dependent tests.
-    Use this when you need an empty database.
+    Use this when you need an empty database. Each instance is a private
+    in-memory database, so tests never touch disk and parallel workers
+    (pytest -n auto) cannot collide.
     """
-    with tempfile.TemporaryDirectory() as tmpdir:
-        db_path = Path(tmpdir) / "test.db"
-        yield SQLiteStorage(db_path)
+    return _TemplateCopyStorage(schema_template)
+
+
+@pytest.fixture
+def now():
+    """Current time, captured once per test, for seeding event timestamps."""
+    return datetime.now()
 
 
 @pytest.fixture
@@ -340,6 +340,18 @@ class TestParseEntry:
         assert events[0].entry_type == "user"
         assert events[0].session_id == "session-1"
 
+    def test_repeated_fields_share_one_string(self):
+        """Test that repeated session ids and tool names across lines are interned."""
+        line = (
+            '{"type": "assistant", "uuid": "%s", "sessionId": "session-1",'
+            ' "timestamp": "2025-01-01T12:00:00.000Z", "message": {"content":'
+            ' [{"type": "tool_use", "id": "%s", "name": "Bash", "input": {"command": "ls"}}]}}'
+        )
+        first = parse_entry(json.loads(line % ("a-1", "t-1")), "test-project")
+        second = parse_entry(json.loads(line % ("a-2", "t-2")), "test-project")
+        assert first[0].session_id is second[0].session_id
+        assert first[1].tool_name is second[1].tool_name
+
     def test_parse_assistant_with_tool(self):
         """Test parsing an assistant message with tool_use.
 
@@ -2,6 +2,8 @@
 
 from datetime import datetime, timedelta
 
+import pytest
+
 from session_analytics.queries import (
     ensure_fresh_data,
     get_cutoff,
@@ -17,7 +19,7 @@ from session_analytics.queries import (
     query_tokens,
     query_tool_frequency,
 )
-from session_analytics.storage import Event, Session
+from session_analytics.storage import Event, Session, SQLiteStorage
 
 # Uses fixtures from conftest.py: storage, populated_storage
 
@@ -106,6 +108,17 @@ class TestQueryCommands:
         for cmd in result["commands"]:
             assert cmd["command"].startswith("gi")
 
+    def test_commands_prefix_matches_wildcards_literally(self, populated_storage):
+        """Test that % and _ in the prefix are not treated as LIKE wildcards."""
+        assert query_commands(populated_storage, days=7, prefix="%")["commands"] == []
+        assert query_commands(populated_storage, days=7, prefix="g_t")["commands"] == []
+        assert query_commands(populated_storage, days=7, prefix="\\")["commands"] == []
+
+    def test_commands_prefix_is_case_insensitive(self, populated_storage):
+        """Test that prefix matching ignores ASCII case."""
+        result = query_commands(populated_storage, days=7, prefix="GI")
+        assert [cmd["command"] for cmd in result["commands"]] == ["git"]
+
     def test_commands_with_project_filter(self, populated_storage):
         """Test command query with project filter."""
         result = query_commands(populated_storage, days=7, project="test")
@@ -164,6 +177,24 @@ class TestQueryTokens:
         models = {b["model"] for b in result["breakdown"]}
         assert "claude-opus-4-5" in models
 
+    @pytest.mark.parametrize(
+        "by,key_fields",
+        [("day", {"day"}), ("session", {"session_id", "project"}), ("model", {"model"})],
+    )
+    def test_breakdown_keys(self, populated_storage, by, key_fields):
+        """Test each grouping's breakdown rows carry its key fields plus token sums."""
+        result = query_tokens(populated_storage, days=7, by=by)
+        token_fields = {
+            "input_tokens",
+            "output_tokens",
+            "cache_read_tokens",
+            "cache_creation_tokens",
+            "event_count",
+        }
+        assert result["breakdown"]
+        assert all(set(b) == key_fields | token_fields for b in result["breakdown"])
+        assert result["total_input_tokens"] == sum(b["input_tokens"] for b in result["breakdown"])
+
     def test_tokens_invalid_grouping(self, populated_storage):
         """Test token query with invalid grouping."""
         result = query_tokens(populated_storage, days=7, by="invalid")
@@ -192,6 +223,29 @@ class TestEnsureFreshData:
         refreshed = ensure_fresh_data(populated_storage, max_age_minutes=5)
         assert not refreshed
 
+    def test_fresh_check_reuses_seen_ingestion_time(self, storage, monkeypatch):
+        """Test that repeated checks within max_age skip reading ingestion state."""
+        from session_analytics.storage import IngestionState
+
+        storage.update_ingestion_state(
+            IngestionState(
+                file_path="/test/file.jsonl",
+                file_size=1000,
+                last_modified=datetime.now(),
+                entries_processed=10,
+                last_processed=datetime.now(),
+            )
+        )
+        reads = []
+        get_last = storage.get_last_ingestion_time
+        monkeypatch.setattr(
+            storage, "get_last_ingestion_time", lambda: reads.append(1) or get_last()
+        )
+
+        assert not ensure_fresh_data(storage, max_age_minutes=5)
+        assert not ensure_fresh_data(storage, max_age_minutes=5)
+        assert len(reads) == 1
+
     def test_force_refresh(self, populated_storage):
         """Test that force=True always refreshes."""
         refreshed = ensure_fresh_data(populated_storage, force=True)
@@ -273,27 +327,19 @@ class TestGetUserJourney:
 
         now = datetime.now()
         # Add user messages from two different sessions
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="journey-1",
-                timestamp=now - timedelta(hours=1),
-                session_id="session-target",
-                project_path="project-a",
-                entry_type="user",
-                message_text="Message from target session",
-            )
-        )
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="journey-2",
-                timestamp=now - timedelta(hours=1),
-                session_id="session-other",
-                project_path="project-a",
-                entry_type="user",
-                message_text="Message from other session",
-            )
+        storage.add_events_batch(
+            [
+                Event(
+                    id=None,
+                    uuid=f"journey-{i}",
+                    timestamp=now - timedelta(hours=1),
+                    session_id=f"session-{name}",
+                    project_path="project-a",
+                    entry_type="user",
+                    message_text=f"Message from {name} session",
+                )
+                for i, name in enumerate(["target", "other"], start=1)
+            ]
         )
 
         # Filter to only target session
@@ -799,6 +845,29 @@ class TestGetHandoffContext:
         # Messages should be in reverse chronological order
         assert "Second message" in result["recent_messages"][0]["message"]
 
+    def test_negative_message_limit_returns_all_messages(self, storage):
+        """Test that a negative message_limit means no limit."""
+        from session_analytics.queries import get_handoff_context
+
+        now = datetime.now()
+        storage.add_events_batch(
+            [
+                Event(
+                    id=None,
+                    uuid=f"all-{i}",
+                    timestamp=now - timedelta(minutes=i),
+                    session_id="all-msg-session",
+                    entry_type="user",
+                    message_text=f"Message {i}",
+                )
+                for i in range(12)
+            ]
+        )
+
+        result = get_handoff_context(storage, session_id="all-msg-session", message_limit=-1)
+
+        assert len(result["recent_messages"]) == 12
+
     def test_returns_modified_files(self, storage):
         """Test that modified files are returned."""
         from session_analytics.queries import get_handoff_context
@@ -872,304 +941,145 @@ class TestGetHandoffContext:
         assert result["session_id"] == "new-session"
 
 
-class TestClassifySessions:
-    """Tests for classify_sessions function."""
+def _sessions_by_id(result: dict) -> dict[str, dict]:
+    """Index classify_sessions() output by session_id for direct lookup."""
+    return {s["session_id"]: s for s in result["sessions"]}
 
-    def test_debugging_classification(self, storage):
-        """Test sessions with high error rate are classified as debugging."""
-        from session_analytics.queries import classify_sessions
 
-        now = datetime.now()
-        events = []
-        # Create session with >15% error rate (6 tools, 2 errors = 33%)
-        for i in range(6):
-            events.append(
-                Event(
-                    id=None,
-                    uuid=f"debug-tool-{i}",
-                    timestamp=now - timedelta(hours=1, minutes=i),
-                    session_id="debug-session",
-                    project_path="/debug/project",
-                    entry_type="tool_use",
-                    tool_name="Bash",
-                    tool_id=f"tool-{i}",
-                )
-            )
-        # Add 2 error results
-        for i in range(2):
-            events.append(
-                Event(
-                    id=None,
-                    uuid=f"debug-error-{i}",
-                    timestamp=now - timedelta(hours=1, minutes=i + 10),
-                    session_id="debug-session",
-                    project_path="/debug/project",
-                    entry_type="tool_result",
-                    tool_id=f"tool-{i}",
-                    is_error=True,
-                )
-            )
-        storage.add_events_batch(events)
+def _classify_tool_use(session_id: str, n: int, now: datetime, **fields) -> Event:
+    """Build the n-th tool_use event of a classify_sessions() scenario."""
+    return Event(
+        id=None,
+        uuid=f"{session_id}-{n}",
+        timestamp=now - timedelta(hours=1, minutes=n),
+        session_id=session_id,
+        **({"project_path": f"/{session_id}/project", "entry_type": "tool_use"} | fields),
+    )
 
-        result = classify_sessions(storage, days=7)
 
-        assert result["session_count"] >= 1
-        # Find debug-session in sessions
-        session = next(
-            (s for s in result["sessions"] if s["session_id"] == "debug-session"),
-            None,
+def _failing_bash_session(sid: str, now: datetime) -> list[Event]:
+    # >15% error rate (6 tools, 2 errors = 33%)
+    return [
+        _classify_tool_use(sid, i, now, tool_name="Bash", tool_id=f"{sid}-tool-{i}")
+        for i in range(6)
+    ] + [
+        _classify_tool_use(
+            sid, i + 10, now, entry_type="tool_result", tool_id=f"{sid}-tool-{i}", is_error=True
         )
-        assert session is not None
-        assert session["category"] == "debugging"
+        for i in range(2)
+    ]
 
-    def test_development_classification(self, storage):
-        """Test sessions with high edit percentage are classified as development."""
-        from session_analytics.queries import classify_sessions
 
-        now = datetime.now()
-        events = []
-        # Create session with >30% Edit tools (4 Edits, 2 other = 67%)
-        for i in range(4):
-            events.append(
-                Event(
-                    id=None,
-                    uuid=f"dev-edit-{i}",
-                    timestamp=now - timedelta(hours=1, minutes=i),
-                    session_id="dev-session",
-                    project_path="/dev/project",
-                    entry_type="tool_use",
-                    tool_name="Edit",
-                    file_path=f"/file{i}.py",
-                )
-            )
-        events.extend(
-            [
-                Event(
-                    id=None,
-                    uuid="dev-read-1",
-                    timestamp=now - timedelta(hours=1, minutes=10),
-                    session_id="dev-session",
-                    project_path="/dev/project",
-                    entry_type="tool_use",
-                    tool_name="Read",
-                ),
-                Event(
-                    id=None,
-                    uuid="dev-bash-1",
-                    timestamp=now - timedelta(hours=1, minutes=11),
-                    session_id="dev-session",
-                    project_path="/dev/project",
-                    entry_type="tool_use",
-                    tool_name="Bash",
-                    command="ls",
-                ),
-            ]
-        )
-        storage.add_events_batch(events)
+def _debug_session(now: datetime) -> list[Event]:
+    return _failing_bash_session("debug-session", now)
 
-        result = classify_sessions(storage, days=7)
 
-        session = next(
-            (s for s in result["sessions"] if s["session_id"] == "dev-session"),
-            None,
-        )
-        assert session is not None
-        assert session["category"] == "development"
+def _development_session(now: datetime) -> list[Event]:
+    # >30% Edit tools (4 Edits, 2 other = 67%)
+    sid = "dev-session"
+    return [
+        _classify_tool_use(sid, i, now, tool_name="Edit", file_path=f"/file{i}.py")
+        for i in range(4)
+    ] + [
+        _classify_tool_use(sid, 10, now, tool_name="Read"),
+        _classify_tool_use(sid, 11, now, tool_name="Bash", command="ls"),
+    ]
 
-    def test_research_classification(self, storage):
-        """Test sessions with Read/search heavy usage are classified as research."""
-        from session_analytics.queries import classify_sessions
 
-        now = datetime.now()
-        events = []
-        # Create session with >40% Read+Grep+WebSearch (5 reads, 2 other = 71%)
-        for i in range(4):
-            events.append(
-                Event(
-                    id=None,
-                    uuid=f"research-read-{i}",
-                    timestamp=now - timedelta(hours=1, minutes=i),
-                    session_id="research-session",
-                    project_path="/research/project",
-                    entry_type="tool_use",
-                    tool_name="Read",
-                )
-            )
-        events.append(
-            Event(
-                id=None,
-                uuid="research-grep-1",
-                timestamp=now - timedelta(hours=1, minutes=5),
-                session_id="research-session",
-                project_path="/research/project",
-                entry_type="tool_use",
-                tool_name="Grep",
-            )
-        )
-        events.append(
-            Event(
-                id=None,
-                uuid="research-bash-1",
-                timestamp=now - timedelta(hours=1, minutes=6),
-                session_id="research-session",
-                project_path="/research/project",
-                entry_type="tool_use",
-                tool_name="Bash",
-                command="ls",
-            )
-        )
-        storage.add_events_batch(events)
+def _research_session(now: datetime) -> list[Event]:
+    # >50% Read+Grep (4 reads, 1 grep, 1 other = 83%)
+    sid = "research-session"
+    return [_classify_tool_use(sid, i, now, tool_name="Read") for i in range(4)] + [
+        _classify_tool_use(sid, 4, now, tool_name="Grep"),
+        _classify_tool_use(sid, 5, now, tool_name="Bash", command="ls"),
+    ]
 
-        result = classify_sessions(storage, days=7)
 
-        session = next(
-            (s for s in result["sessions"] if s["session_id"] == "research-session"),
-            None,
-        )
-        assert session is not None
-        assert session["category"] == "research"
+def _maintenance_session(now: datetime) -> list[Event]:
+    # >30% git/gh/make commands (5 git, 1 other = 83%)
+    sid = "maint-session"
+    return [_classify_tool_use(sid, i, now, tool_name="Bash", command="git") for i in range(5)] + [
+        _classify_tool_use(sid, 5, now, tool_name="Read")
+    ]
 
-    def test_maintenance_classification(self, storage):
-        """Test sessions with git/build commands are classified as maintenance."""
-        from session_analytics.queries import classify_sessions
 
-        now = datetime.now()
-        events = []
-        # Create session with >50% git/gh/make commands (5 git, 1 other = 83%)
-        for i in range(5):
-            events.append(
-                Event(
-                    id=None,
-                    uuid=f"maint-git-{i}",
-                    timestamp=now - timedelta(hours=1, minutes=i),
-                    session_id="maint-session",
-                    project_path="/maint/project",
-                    entry_type="tool_use",
-                    tool_name="Bash",
-                    command="git",
-                )
-            )
-        events.append(
-            Event(
-                id=None,
-                uuid="maint-read-1",
-                timestamp=now - timedelta(hours=1, minutes=6),
-                session_id="maint-session",
-                project_path="/maint/project",
-                entry_type="tool_use",
-                tool_name="Read",
-            )
-        )
-        storage.add_events_batch(events)
+def _mixed_session(now: datetime) -> list[Event]:
+    # Even mix of different activities - none dominant
+    sid = "mixed-session"
+    return [
+        _classify_tool_use(sid, 0, now, tool_name="Read"),
+        _classify_tool_use(sid, 1, now, tool_name="Edit", file_path="/file.py"),
+        _classify_tool_use(sid, 2, now, tool_name="Bash", command="python"),
+        _classify_tool_use(sid, 3, now, tool_name="Bash", command="ls"),
+        _classify_tool_use(sid, 4, now, tool_name="Write", file_path="/new.txt"),
+    ]
 
-        result = classify_sessions(storage, days=7)
 
-        session = next(
-            (s for s in result["sessions"] if s["session_id"] == "maint-session"),
-            None,
-        )
-        assert session is not None
-        assert session["category"] == "maintenance"
+def _factors_session(now: datetime) -> list[Event]:
+    # Same failure rate as _debug_session, checked for its classification factors
+    return _failing_bash_session("factors-session", now)
 
-    def test_mixed_classification(self, storage):
-        """Test sessions without dominant patterns are classified as mixed."""
-        from session_analytics.queries import classify_sessions
 
-        now = datetime.now()
-        events = [
-            # Even mix of different activities - none dominant
-            Event(
-                id=None,
-                uuid="mixed-1",
-                timestamp=now - timedelta(hours=1, minutes=1),
-                session_id="mixed-session",
-                project_path="/mixed/project",
-                entry_type="tool_use",
-                tool_name="Read",
-            ),
-            Event(
-                id=None,
-                uuid="mixed-2",
-                timestamp=now - timedelta(hours=1, minutes=2),
-                session_id="mixed-session",
-                project_path="/mixed/project",
-                entry_type="tool_use",
-                tool_name="Edit",
-                file_path="/file.py",
-            ),
-            Event(
-                id=None,
-                uuid="mixed-3",
-                timestamp=now - timedelta(hours=1, minutes=3),
-                session_id="mixed-session",
-                project_path="/mixed/project",
-                entry_type="tool_use",
-                tool_name="Bash",
-                command="python",
-            ),
-            Event(
-                id=None,
-                uuid="mixed-4",
-                timestamp=now - timedelta(hours=1, minutes=4),
-                session_id="mixed-session",
-                project_path="/mixed/project",
-                entry_type="tool_use",
-                tool_name="Bash",
-                command="ls",
-            ),
-            Event(
-                id=None,
-                uuid="mixed-5",
-                timestamp=now - timedelta(hours=1, minutes=5),
-                session_id="mixed-session",
-                project_path="/mixed/project",
-                entry_type="tool_use",
-                tool_name="Write",
-                file_path="/new.txt",
-            ),
-        ]
-        storage.add_events_batch(events)
+_CLASSIFY_SCENARIOS = [
+    _debug_session,
+    _development_session,
+    _research_session,
+    _maintenance_session,
+    _mixed_session,
+    _factors_session,
+]
 
-        result = classify_sessions(storage, days=7)
 
-        session = next(
-            (s for s in result["sessions"] if s["session_id"] == "mixed-session"),
-            None,
-        )
-        assert session is not None
-        assert session["category"] == "mixed"
+@pytest.fixture(scope="class")
+def classified_scenarios():
+    """classify_sessions() result over every scenario, seeded into one database.
+
+    The scenarios use disjoint session ids, so a single batch insert and a
+    single classification serve all of the category assertions below.
+    """
+    from session_analytics.queries import classify_sessions
+
+    now = datetime.now()
+    storage = SQLiteStorage(":memory:")
+    storage.add_events_batch([e for build in _CLASSIFY_SCENARIOS for e in build(now)])
+    return _sessions_by_id(classify_sessions(storage, days=7))
+
+
+class TestClassifySessions:
+    """Tests for classify_sessions function."""
+
+    @pytest.mark.parametrize(
+        "session_id,expected_category",
+        [
+            ("debug-session", "debugging"),
+            ("dev-session", "development"),
+            ("research-session", "research"),
+            ("maint-session", "maintenance"),
+            ("mixed-session", "mixed"),
+            ("factors-session", "debugging"),
+        ],
+    )
+    def test_scenario_classification(self, classified_scenarios, session_id, expected_category):
+        """Test each seeded scenario lands in its expected category."""
+        assert classified_scenarios[session_id]["category"] == expected_category
 
     def test_project_filter(self, storage):
         """Test that project filter correctly limits results."""
         from session_analytics.queries import classify_sessions
 
         now = datetime.now()
-        events = []
         # Two different projects
-        for i in range(6):
-            events.append(
-                Event(
-                    id=None,
-                    uuid=f"proj-a-{i}",
-                    timestamp=now - timedelta(hours=1, minutes=i),
-                    session_id="proj-a-session",
-                    project_path="/project-alpha",
-                    entry_type="tool_use",
-                    tool_name="Edit",
-                )
+        events = [
+            _classify_tool_use(
+                "proj-a-session", i, now, project_path="/project-alpha", tool_name="Edit"
             )
-        for i in range(6):
-            events.append(
-                Event(
-                    id=None,
-                    uuid=f"proj-b-{i}",
-                    timestamp=now - timedelta(hours=2, minutes=i),
-                    session_id="proj-b-session",
-                    project_path="/project-beta",
-                    entry_type="tool_use",
-                    tool_name="Read",
-                )
+            for i in range(6)
+        ] + [
+            _classify_tool_use(
+                "proj-b-session", i + 60, now, project_path="/project-beta", tool_name="Read"
             )
+            for i in range(6)
+        ]
         storage.add_events_batch(events)
 
         result = classify_sessions(storage, days=7, project="alpha")
@@ -1177,96 +1087,41 @@ class TestClassifySessions:
         assert result["session_count"] == 1
         assert result["sessions"][0]["session_id"] == "proj-a-session"
 
-    def test_min_event_threshold(self, storage):
+    def test_min_event_threshold_empty_db(self, storage):
+        """Test that an empty database classifies no sessions."""
+        from session_analytics.queries import classify_sessions
+
+        result = classify_sessions(storage, days=7)
+
+        assert result["session_count"] == 0
+        assert result["sessions"] == []
+
+    def test_min_event_threshold_below_cutoff(self, storage):
         """Test that sessions with <5 events are excluded."""
         from session_analytics.queries import classify_sessions
 
         now = datetime.now()
-        events = [
-            # Only 3 events - should be excluded
-            Event(
-                id=None,
-                uuid="small-1",
-                timestamp=now - timedelta(hours=1),
-                session_id="small-session",
-                project_path="/small/project",
-                entry_type="tool_use",
-                tool_name="Read",
-            ),
-            Event(
-                id=None,
-                uuid="small-2",
-                timestamp=now - timedelta(hours=1, minutes=1),
-                session_id="small-session",
-                project_path="/small/project",
-                entry_type="tool_use",
-                tool_name="Edit",
-            ),
-            Event(
-                id=None,
-                uuid="small-3",
-                timestamp=now - timedelta(hours=1, minutes=2),
-                session_id="small-session",
-                project_path="/small/project",
-                entry_type="tool_use",
-                tool_name="Bash",
-                command="ls",
-            ),
-        ]
-        storage.add_events_batch(events)
+        # Only 3 events - should be excluded
+        storage.add_events_batch(
+            [
+                _classify_tool_use("small-session", 0, now, tool_name="Read"),
+                _classify_tool_use("small-session", 1, now, tool_name="Edit"),
+                _classify_tool_use("small-session", 2, now, tool_name="Bash", command="ls"),
+            ]
+        )
 
         result = classify_sessions(storage, days=7)
 
         # Session with only 3 events should be excluded
         assert result["session_count"] == 0
 
-    def test_classification_factors_included(self, storage):
+    def test_classification_factors_included(self, classified_scenarios):
         """Test that classification_factors explains WHY sessions were categorized.
 
         RFC #49: Without classification_factors, an LLM seeing 'category: debugging'
         cannot explain to the user why it was classified that way.
         """
-        from session_analytics.queries import classify_sessions
-
-        now = datetime.now()
-        events = []
-        # Create session with >15% error rate to trigger debugging classification
-        for i in range(6):
-            events.append(
-                Event(
-                    id=None,
-                    uuid=f"factors-tool-{i}",
-                    timestamp=now - timedelta(hours=1, minutes=i),
-                    session_id="factors-session",
-                    project_path="/factors/project",
-                    entry_type="tool_use",
-                    tool_name="Bash",
-                    tool_id=f"tool-{i}",
-                )
-            )
-        # Add 2 error results (33% error rate)
-        for i in range(2):
-            events.append(
-                Event(
-                    id=None,
-                    uuid=f"factors-error-{i}",
-                    timestamp=now - timedelta(hours=1, minutes=i + 10),
-                    session_id="factors-session",
-                    project_path="/factors/project",
-                    entry_type="tool_result",
-                    tool_id=f"tool-{i}",
-                    is_error=True,
-                )
-            )
-        storage.add_events_batch(events)
-
-        result = classify_sessions(storage, days=7)
-
-        session = next(
-            (s for s in result["sessions"] if s["session_id"] == "factors-session"),
-            None,
-        )
-        assert session is not None
+        session = classified_scenarios["factors-session"]
         assert session["category"] == "debugging"
 
         # Verify classification_factors exists and explains WHY
@@ -1281,12 +1136,58 @@ class TestClassifySessions:
         assert "error_rate" in factors
         assert factors["error_rate"] > 15  # Should be ~33%
 
+    def test_trigger_reports_current_threshold(self, storage, monkeypatch):
+        """Test that the reported trigger is built from the threshold constant."""
+        from session_analytics import queries
 
-class TestGetUserJourneyIncludeProjects:
-    """Test for get_user_journey with include_projects=False."""
+        monkeypatch.setattr(queries, "DEVELOPMENT_EDIT_RATE", 0.25)
+        now = datetime.now()
+        storage.add_events_batch(
+            [_classify_tool_use("edit-session", i, now, tool_name="Edit") for i in range(6)]
+        )
 
-    def test_journey_without_projects(self, storage):
-        """Test that include_projects=False excludes project info."""
+        session = queries.classify_sessions(storage, days=7)["sessions"][0]
+
+        assert session["classification_factors"]["trigger"] == "edit_rate > 25%"
+
+    def test_files_read_multiple_times(self, storage):
+        """Test efficiency counts files read more than once in the session."""
+        from session_analytics.queries import classify_sessions
+
+        now = datetime.now()
+        # a.py read 3 times, b.py twice, c.py once -> 2 files re-read
+        paths = ["/a.py", "/a.py", "/a.py", "/b.py", "/b.py", "/c.py"]
+        events = [
+            Event(
+                id=None,
+                uuid=f"reread-{i}",
+                timestamp=now - timedelta(hours=1, minutes=i),
+                session_id="reread-session",
+                project_path="/reread/project",
+                entry_type="tool_use",
+                tool_name="Read",
+                file_path=path,
+            )
+            for i, path in enumerate(paths)
+        ]
+        storage.add_events_batch(events)
+
+        result = classify_sessions(storage, days=7)
+
+        assert result["session_count"] == 1
+        efficiency = result["sessions"][0]["efficiency"]
+        assert efficiency["files_read_multiple_times"] == 2
+
+
+# Keys of a get_user_journey() event when include_projects=False
+JOURNEY_EVENT_KEYS_WITHOUT_PROJECTS = frozenset({"timestamp", "session_id", "type", "message"})
+
+
+class TestGetUserJourneyIncludeProjects:
+    """Test for get_user_journey with include_projects=False."""
+
+    def test_journey_without_projects(self, storage):
+        """Test that include_projects=False excludes project info."""
         from session_analytics.queries import get_user_journey
 
         now = datetime.now()
@@ -1317,53 +1218,59 @@ class TestGetUserJourneyIncludeProjects:
         assert result["message_count"] == 2
         assert result["projects_visited"] is None
         assert result["project_switches"] is None
-        for event in result["journey"]:
-            assert "project" not in event
+        assert {frozenset(event) for event in result["journey"]} == {
+            JOURNEY_EVENT_KEYS_WITHOUT_PROJECTS
+        }
 
 
-class TestQueryFileActivity:
-    """Tests for file activity queries."""
+@pytest.fixture(scope="module")
+def shared_test_project():
+    """Storage seeded once with the "-test" corpus for the basic file/language/MCP tests.
 
-    def test_basic_file_activity(self, storage):
-        """Test basic file activity query."""
-        now = datetime.now()
-        events = [
-            Event(
-                id=None,
-                uuid="f1",
-                timestamp=now - timedelta(hours=1),
-                session_id="s1",
-                project_path="-test",
-                entry_type="tool_use",
-                tool_name="Read",
-                file_path="/path/to/file.py",
-            ),
-            Event(
-                id=None,
-                uuid="f2",
-                timestamp=now - timedelta(hours=2),
-                session_id="s1",
-                project_path="-test",
-                entry_type="tool_use",
-                tool_name="Edit",
-                file_path="/path/to/file.py",
-            ),
-            Event(
-                id=None,
-                uuid="f3",
-                timestamp=now - timedelta(hours=3),
+    Contains:
+    - file.py read and edited, new.py written, code.rs and doc.md read
+    - Three MCP calls: two on the github server, one on event-bus
+
+    Read-only: tests must not add events to it.
+    """
+    now = datetime.now()
+    calls = [
+        ("Read", "/path/to/file.py"),
+        ("Edit", "/path/to/file.py"),
+        ("Write", "/path/to/new.py"),
+        ("Read", "/path/to/code.rs"),
+        ("Read", "/path/to/doc.md"),
+        ("mcp__github__get_issue", None),
+        ("mcp__github__create_pr", None),
+        ("mcp__event-bus__publish_event", None),
+    ]
+    storage = SQLiteStorage(":memory:")
+    storage.add_events_batch(
+        [
+            Event(
+                id=None,
+                uuid=f"shared-{i}",
+                timestamp=now - timedelta(hours=i + 1),
                 session_id="s1",
                 project_path="-test",
                 entry_type="tool_use",
-                tool_name="Write",
-                file_path="/path/to/new.py",
-            ),
+                tool_name=tool_name,
+                file_path=file_path,
+            )
+            for i, (tool_name, file_path) in enumerate(calls)
         ]
-        storage.add_events_batch(events)
+    )
+    return storage
+
+
+class TestQueryFileActivity:
+    """Tests for file activity queries."""
 
-        result = query_file_activity(storage, days=7)
-        assert result["file_count"] == 2
-        assert len(result["files"]) == 2
+    def test_basic_file_activity(self, shared_test_project):
+        """Test basic file activity query."""
+        result = query_file_activity(shared_test_project, days=7)
+        assert result["file_count"] == 4
+        assert len(result["files"]) == 4
 
         # file.py should have 2 operations (1 read, 1 edit)
         file_py = next(f for f in result["files"] if "file.py" in f["file"])
@@ -1412,60 +1319,41 @@ class TestQueryFileActivity:
 class TestQueryLanguages:
     """Tests for language distribution queries."""
 
-    def test_basic_languages(self, storage):
+    def test_basic_languages(self, shared_test_project):
         """Test basic language distribution."""
+        result = query_languages(shared_test_project, days=7)
+        assert result["total_operations"] == 5
+
+        langs = {lang["language"]: lang["count"] for lang in result["languages"]}
+        assert langs.get("Python") == 3
+        assert langs.get("Rust") == 1
+        assert langs.get("Markdown") == 1
+
+    def test_extension_case_and_unknown(self, storage):
+        """Test extensions match case-insensitively and unknown ones fall into Other."""
         now = datetime.now()
-        events = [
-            Event(
-                id=None,
-                uuid="l1",
-                timestamp=now - timedelta(hours=1),
-                session_id="s1",
-                project_path="-test",
-                entry_type="tool_use",
-                tool_name="Read",
-                file_path="/path/to/file.py",
-            ),
-            Event(
-                id=None,
-                uuid="l2",
-                timestamp=now - timedelta(hours=2),
-                session_id="s1",
-                project_path="-test",
-                entry_type="tool_use",
-                tool_name="Edit",
-                file_path="/path/to/file.py",
-            ),
-            Event(
-                id=None,
-                uuid="l3",
-                timestamp=now - timedelta(hours=3),
-                session_id="s1",
-                project_path="-test",
-                entry_type="tool_use",
-                tool_name="Read",
-                file_path="/path/to/code.rs",
-            ),
-            Event(
-                id=None,
-                uuid="l4",
-                timestamp=now - timedelta(hours=4),
-                session_id="s1",
-                project_path="-test",
-                entry_type="tool_use",
-                tool_name="Read",
-                file_path="/path/to/doc.md",
-            ),
-        ]
-        storage.add_events_batch(events)
+        paths = ["/src/Main.PY", "/src/lib.Rs", "/Makefile", "/notes.txt", "/a.b/LICENSE"]
+        storage.add_events_batch(
+            [
+                Event(
+                    id=None,
+                    uuid=f"case-{i}",
+                    timestamp=now - timedelta(hours=1),
+                    session_id="s1",
+                    project_path="-test",
+                    entry_type="tool_use",
+                    tool_name="Read",
+                    file_path=path,
+                )
+                for i, path in enumerate(paths)
+            ]
+        )
 
         result = query_languages(storage, days=7)
-        assert result["total_operations"] == 4
 
         langs = {lang["language"]: lang["count"] for lang in result["languages"]}
-        assert langs.get("Python") == 2
-        assert langs.get("Rust") == 1
-        assert langs.get("Markdown") == 1
+        assert langs == {"Python": 1, "Rust": 1, "Other": 3}
+        assert result["languages"][0]["language"] == "Other"
 
 
 class TestQueryProjects:
@@ -1538,50 +1426,10 @@ class TestQueryProjects:
 class TestQueryMcpUsage:
     """Tests for MCP usage queries."""
 
-    def test_basic_mcp_usage(self, storage):
+    def test_basic_mcp_usage(self, shared_test_project):
         """Test basic MCP usage breakdown."""
-        now = datetime.now()
-        events = [
-            Event(
-                id=None,
-                uuid="m1",
-                timestamp=now - timedelta(hours=1),
-                session_id="s1",
-                project_path="-test",
-                entry_type="tool_use",
-                tool_name="mcp__github__get_issue",
-            ),
-            Event(
-                id=None,
-                uuid="m2",
-                timestamp=now - timedelta(hours=2),
-                session_id="s1",
-                project_path="-test",
-                entry_type="tool_use",
-                tool_name="mcp__github__create_pr",
-            ),
-            Event(
-                id=None,
-                uuid="m3",
-                timestamp=now - timedelta(hours=3),
-                session_id="s1",
-                project_path="-test",
-                entry_type="tool_use",
-                tool_name="mcp__event-bus__publish_event",
-            ),
-            Event(
-                id=None,
-                uuid="m4",
-                timestamp=now - timedelta(hours=4),
-                session_id="s1",
-                project_path="-test",
-                entry_type="tool_use",
-                tool_name="Read",  # Non-MCP tool, should be ignored
-            ),
-        ]
-        storage.add_events_batch(events)
-
-        result = query_mcp_usage(storage, days=7)
+        result = query_mcp_usage(shared_test_project, days=7)
+        # The corpus also holds Read/Edit/Write events, which must be ignored
         assert result["total_mcp_calls"] == 3
 
         servers = {s["server"]: s for s in result["servers"]}
@@ -1595,40 +1443,75 @@ class TestQueryMcpUsage:
 
         assert servers["event-bus"]["total"] == 1
 
+    def test_mcp_name_edge_cases(self, storage):
+        """Test nested separators, missing tool part, and non-MCP lookalikes."""
+        now = datetime.now()
+        names = ["mcp__db__query__raw", "mcp__lonely", "mcpXXsrvXXtool", "mcp_single", "MCP__up__x"]
+        storage.add_events_batch(
+            [
+                Event(
+                    id=None,
+                    uuid=f"mcp-edge-{i}",
+                    timestamp=now - timedelta(hours=1),
+                    session_id="s1",
+                    project_path="-test",
+                    entry_type="tool_use",
+                    tool_name=name,
+                )
+                for i, name in enumerate(names)
+            ]
+        )
+
+        result = query_mcp_usage(storage, days=7)
+
+        # "mcp__" is matched literally and case-sensitively: lookalikes are not MCP tools
+        assert result["total_mcp_calls"] == 2
+        servers = {s["server"]: s["tools"] for s in result["servers"]}
+        assert servers["db"] == [{"tool": "query__raw", "count": 1}]
+        assert servers["unknown"] == [{"tool": "mcp__lonely", "count": 1}]
+
 
 class TestGetCutoff:
     """Tests for get_cutoff() helper function."""
 
-    def test_cutoff_days_only(self):
+    @pytest.fixture(autouse=True)
+    def frozen_now(self, monkeypatch):
+        """Pin queries.datetime.now() so cutoffs can be compared exactly."""
+        now = datetime(2024, 1, 1, 12, 0, 0)
+
+        class FrozenDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return now
+
+        monkeypatch.setattr("session_analytics.queries.datetime", FrozenDatetime)
+        return now
+
+    def test_cutoff_days_only(self, frozen_now):
         """Test cutoff with days parameter."""
-        cutoff = get_cutoff(days=7)
-        expected = datetime.now() - timedelta(days=7)
-        # Allow 1 second tolerance for test execution time
-        assert abs((cutoff - expected).total_seconds()) < 1
+        assert get_cutoff(days=7) == frozen_now - timedelta(days=7)
 
-    def test_cutoff_hours_only(self):
+    def test_cutoff_hours_only(self, frozen_now):
         """Test cutoff with hours parameter (days=0)."""
-        cutoff = get_cutoff(days=0, hours=12)
-        expected = datetime.now() - timedelta(hours=12)
-        assert abs((cutoff - expected).total_seconds()) < 1
+        assert get_cutoff(days=0, hours=12) == frozen_now - timedelta(hours=12)
 
-    def test_cutoff_days_and_hours_combined(self):
+    def test_cutoff_days_and_hours_combined(self, frozen_now):
         """Test cutoff with both days and hours."""
-        cutoff = get_cutoff(days=1, hours=6)
-        expected = datetime.now() - timedelta(hours=30)  # 24 + 6 = 30 hours
-        assert abs((cutoff - expected).total_seconds()) < 1
+        # 24 + 6 = 30 hours
+        assert get_cutoff(days=1, hours=6) == frozen_now - timedelta(hours=30)
 
-    def test_cutoff_fractional_days(self):
+    def test_cutoff_fractional_days(self, frozen_now):
         """Test cutoff with fractional days (e.g., 0.5 = 12 hours)."""
-        cutoff = get_cutoff(days=0.5)
-        expected = datetime.now() - timedelta(hours=12)
-        assert abs((cutoff - expected).total_seconds()) < 1
+        assert get_cutoff(days=0.5) == frozen_now - timedelta(hours=12)
 
-    def test_cutoff_default_values(self):
+    def test_cutoff_default_values(self, frozen_now):
         """Test cutoff with default parameters (7 days, 0 hours)."""
-        cutoff = get_cutoff()
-        expected = datetime.now() - timedelta(days=7)
-        assert abs((cutoff - expected).total_seconds()) < 1
+        assert get_cutoff() == frozen_now - timedelta(days=7)
+
+    def test_cutoff_explicit_now(self):
+        """Test that an explicit reference time overrides the clock."""
+        now = datetime(2023, 6, 1)
+        assert get_cutoff(days=1, now=now) == datetime(2023, 5, 31)
 
 
 class TestNormalizeDatetime:
@@ -1710,31 +1593,31 @@ class TestQueryAgentActivity:
     def test_main_session_only(self, storage):
         """Test with only main session events (no agent_id)."""
         now = datetime.now()
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="main-1",
-                timestamp=now,
-                session_id="s1",
-                project_path="test-project",
-                entry_type="assistant",
-                input_tokens=100,
-                output_tokens=50,
-                agent_id=None,  # Main session
-            )
-        )
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="main-2",
-                timestamp=now,
-                session_id="s1",
-                project_path="test-project",
-                entry_type="tool_use",
-                tool_name="Read",
-                input_tokens=None,  # tool_use has no tokens
-                agent_id=None,
-            )
+        storage.add_events_batch(
+            [
+                Event(
+                    id=None,
+                    uuid="main-1",
+                    timestamp=now,
+                    session_id="s1",
+                    project_path="test-project",
+                    entry_type="assistant",
+                    input_tokens=100,
+                    output_tokens=50,
+                    agent_id=None,  # Main session
+                ),
+                Event(
+                    id=None,
+                    uuid="main-2",
+                    timestamp=now,
+                    session_id="s1",
+                    project_path="test-project",
+                    entry_type="tool_use",
+                    tool_name="Read",
+                    input_tokens=None,  # tool_use has no tokens
+                    agent_id=None,
+                ),
+            ]
         )
 
         result = query_agent_activity(storage, days=1)
@@ -1751,48 +1634,45 @@ class TestQueryAgentActivity:
         """Test with both main session and agent events."""
         now = datetime.now()
 
-        # Main session events
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="main-1",
-                timestamp=now,
-                session_id="s1",
-                project_path="test-project",
-                entry_type="assistant",
-                input_tokens=200,
-                output_tokens=100,
-                agent_id=None,
-            )
-        )
-
-        # Agent events
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="agent-1",
-                timestamp=now,
-                session_id="s1",
-                project_path="test-project",
-                entry_type="assistant",
-                input_tokens=300,
-                output_tokens=150,
-                agent_id="a123456",
-                is_sidechain=True,
-            )
-        )
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="agent-2",
-                timestamp=now,
-                session_id="s1",
-                project_path="test-project",
-                entry_type="tool_use",
-                tool_name="Bash",
-                agent_id="a123456",
-                is_sidechain=True,
-            )
+        storage.add_events_batch(
+            [
+                # Main session events
+                Event(
+                    id=None,
+                    uuid="main-1",
+                    timestamp=now,
+                    session_id="s1",
+                    project_path="test-project",
+                    entry_type="assistant",
+                    input_tokens=200,
+                    output_tokens=100,
+                    agent_id=None,
+                ),
+                # Agent events
+                Event(
+                    id=None,
+                    uuid="agent-1",
+                    timestamp=now,
+                    session_id="s1",
+                    project_path="test-project",
+                    entry_type="assistant",
+                    input_tokens=300,
+                    output_tokens=150,
+                    agent_id="a123456",
+                    is_sidechain=True,
+                ),
+                Event(
+                    id=None,
+                    uuid="agent-2",
+                    timestamp=now,
+                    session_id="s1",
+                    project_path="test-project",
+                    entry_type="tool_use",
+                    tool_name="Bash",
+                    agent_id="a123456",
+                    is_sidechain=True,
+                ),
+            ]
         )
 
         result = query_agent_activity(storage, days=1)
@@ -1821,32 +1701,31 @@ class TestQueryAgentActivity:
         """Test with multiple agents."""
         now = datetime.now()
 
-        # Agent A
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="agent-a-1",
-                timestamp=now,
-                session_id="s1",
-                project_path="test-project",
-                entry_type="assistant",
-                input_tokens=400,
-                agent_id="agent-a",
-            )
-        )
-
-        # Agent B
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="agent-b-1",
-                timestamp=now,
-                session_id="s1",
-                project_path="test-project",
-                entry_type="assistant",
-                input_tokens=100,
-                agent_id="agent-b",
-            )
+        storage.add_events_batch(
+            [
+                # Agent A
+                Event(
+                    id=None,
+                    uuid="agent-a-1",
+                    timestamp=now,
+                    session_id="s1",
+                    project_path="test-project",
+                    entry_type="assistant",
+                    input_tokens=400,
+                    agent_id="agent-a",
+                ),
+                # Agent B
+                Event(
+                    id=None,
+                    uuid="agent-b-1",
+                    timestamp=now,
+                    session_id="s1",
+                    project_path="test-project",
+                    entry_type="assistant",
+                    input_tokens=100,
+                    agent_id="agent-b",
+                ),
+            ]
         )
 
         result = query_agent_activity(storage, days=1)
@@ -1866,7 +1745,7 @@ class TestQueryAgentActivity:
         now = datetime.now()
 
         # Agent with multiple tool uses
-        storage.add_event(
+        events = [
             Event(
                 id=None,
                 uuid="agent-assist",
@@ -1877,9 +1756,9 @@ class TestQueryAgentActivity:
                 input_tokens=100,
                 agent_id="agent-1",
             )
-        )
+        ]
         for i, tool in enumerate(["Read", "Read", "Read", "Edit", "Bash"]):
-            storage.add_event(
+            events.append(
                 Event(
                     id=None,
                     uuid=f"agent-tool-{i}",
@@ -1891,6 +1770,7 @@ class TestQueryAgentActivity:
                     agent_id="agent-1",
                 )
             )
+        storage.add_events_batch(events)
 
         result = query_agent_activity(storage, days=1)
 
@@ -1903,36 +1783,61 @@ class TestQueryAgentActivity:
         assert agent["top_tools"][0]["tool"] == "Read"
         assert agent["top_tools"][0]["count"] == 3
 
+    def test_top_tools_capped_at_five(self, storage, now):
+        """Test that top_tools keeps only the five most used tools per agent."""
+        tools = ["Read"] * 3 + ["Edit"] * 2 + ["Bash", "Grep", "Glob", "Write"]
+        storage.add_events_batch(
+            [
+                Event(
+                    id=None,
+                    uuid=f"capped-tool-{i}",
+                    timestamp=now,
+                    session_id="s1",
+                    project_path="test-project",
+                    entry_type="tool_use",
+                    tool_name=tool,
+                    agent_id="agent-1",
+                )
+                for i, tool in enumerate(tools)
+            ]
+        )
+
+        result = query_agent_activity(storage, days=1)
+
+        top_tools = result["agents"][0]["top_tools"]
+        assert len(top_tools) == 5
+        assert top_tools[0] == {"tool": "Read", "count": 3}
+        assert top_tools[1] == {"tool": "Edit", "count": 2}
+
     def test_project_filter(self, storage):
         """Test project filter works."""
         now = datetime.now()
 
-        # Project A events
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="project-a",
-                timestamp=now,
-                session_id="s1",
-                project_path="project-a",
-                entry_type="assistant",
-                input_tokens=100,
-                agent_id="agent-1",
-            )
-        )
-
-        # Project B events
-        storage.add_event(
-            Event(
-                id=None,
-                uuid="project-b",
-                timestamp=now,
-                session_id="s2",
-                project_path="project-b",
-                entry_type="assistant",
-                input_tokens=200,
-                agent_id="agent-2",
-            )
+        storage.add_events_batch(
+            [
+                # Project A events
+                Event(
+                    id=None,
+                    uuid="project-a",
+                    timestamp=now,
+                    session_id="s1",
+                    project_path="project-a",
+                    entry_type="assistant",
+                    input_tokens=100,
+                    agent_id="agent-1",
+                ),
+                # Project B events
+                Event(
+                    id=None,
+                    uuid="project-b",
+                    timestamp=now,
+                    session_id="s2",
+                    project_path="project-b",
+                    entry_type="assistant",
+                    input_tokens=200,
+                    agent_id="agent-2",
+                ),
+            ]
         )
 
         result = query_agent_activity(storage, days=1, project="project-a")
@@ -1975,6 +1880,98 @@ class TestQueryAgentActivity:
         assert result["summary"]["agent_token_percentage"] == 0
 
 
+# tool_input_json payloads for the error detail tests
+GLOB_PY_SRC = '{"pattern": "*.py", "path": "/src"}'
+GREP_TODO_SRC = '{"pattern": "TODO", "path": "/src"}'
+GLOB_OLD = '{"pattern": "old"}'
+
+
+def _make_error_event_pair(
+    now: datetime,
+    tool_name: str,
+    tool_id: str,
+    *,
+    hours_ago: float,
+    is_error: bool = True,
+    **use_fields,
+) -> list[Event]:
+    """Build a tool_use event and its (by default failing) tool_result."""
+    timestamp = now - timedelta(hours=hours_ago)
+    return [
+        Event(
+            id=None,
+            uuid=f"{tool_id}-use",
+            timestamp=timestamp,
+            session_id="s1",
+            project_path="-test-project",
+            entry_type="tool_use",
+            tool_name=tool_name,
+            tool_id=tool_id,
+            **use_fields,
+        ),
+        Event(
+            id=None,
+            uuid=f"{tool_id}-result",
+            timestamp=timestamp - timedelta(seconds=1),
+            session_id="s1",
+            project_path="-test-project",
+            entry_type="tool_result",
+            tool_id=tool_id,
+            is_error=is_error,
+        ),
+    ]
+
+
+@pytest.fixture(scope="module")
+def error_corpus_now() -> datetime:
+    """Reference time the error corpus is built around; pass as now= when querying it."""
+    return datetime.now()
+
+
+@pytest.fixture(scope="module")
+def error_corpus(error_corpus_now):
+    """Storage seeded once with failing tool calls for the error detail tests.
+
+    Contains (hours ago):
+    - Glob "*.py" in /src twice (1h, 2h), Glob "old" 10 days ago
+    - Bash "git status" (3h) and "make" (4h)
+    - Grep "TODO" in /src (5h)
+    - Edit /path/to/missing.py (6h)
+
+    Read-only: tests must not add events to it.
+    """
+    now = error_corpus_now
+    glob_py = {"tool_input_json": GLOB_PY_SRC}
+    events = [
+        *_make_error_event_pair(now, "Glob", "tool-glob-1", hours_ago=1, **glob_py),
+        *_make_error_event_pair(now, "Glob", "tool-glob-2", hours_ago=2, **glob_py),
+        *_make_error_event_pair(
+            now, "Bash", "tool-bash-1", hours_ago=3, command="git", command_args="status"
+        ),
+        *_make_error_event_pair(now, "Bash", "tool-bash-2", hours_ago=4, command="make"),
+        *_make_error_event_pair(
+            now,
+            "Grep",
+            "tool-grep",
+            hours_ago=5,
+            tool_input_json=GREP_TODO_SRC,
+        ),
+        *_make_error_event_pair(
+            now, "Edit", "tool-edit", hours_ago=6, file_path="/path/to/missing.py"
+        ),
+        *_make_error_event_pair(
+            now,
+            "Glob",
+            "tool-old",
+            hours_ago=24 * 10,
+            tool_input_json=GLOB_OLD,
+        ),
+    ]
+    storage = SQLiteStorage(":memory:")
+    storage.add_events_batch(events)
+    return storage
+
+
 class TestQueryErrorDetails:
     """Tests for query_error_details().
 
@@ -1982,90 +1979,12 @@ class TestQueryErrorDetails:
     caused tool errors, enabling drill-down from aggregate error counts.
     """
 
-    def test_basic_error_aggregation(self, storage):
+    def test_basic_error_aggregation(self, error_corpus, error_corpus_now):
         """Test basic error aggregation by tool and parameter."""
-        import json
-
-        now = datetime.now()
-
-        # Create tool_use events with tool_input_json
-        events = [
-            # Glob error with pattern
-            Event(
-                id=None,
-                uuid="glob-use-1",
-                timestamp=now - timedelta(hours=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_use",
-                tool_name="Glob",
-                tool_id="tool-glob-1",
-                tool_input_json=json.dumps({"pattern": "*.py", "path": "/src"}),
-            ),
-            Event(
-                id=None,
-                uuid="glob-result-1",
-                timestamp=now - timedelta(hours=1, seconds=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_result",
-                tool_id="tool-glob-1",
-                is_error=True,
-            ),
-            # Another Glob error with same pattern (should aggregate)
-            Event(
-                id=None,
-                uuid="glob-use-2",
-                timestamp=now - timedelta(hours=2),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_use",
-                tool_name="Glob",
-                tool_id="tool-glob-2",
-                tool_input_json=json.dumps({"pattern": "*.py", "path": "/src"}),
-            ),
-            Event(
-                id=None,
-                uuid="glob-result-2",
-                timestamp=now - timedelta(hours=2, seconds=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_result",
-                tool_id="tool-glob-2",
-                is_error=True,
-            ),
-            # Bash error with command
-            Event(
-                id=None,
-                uuid="bash-use-1",
-                timestamp=now - timedelta(hours=3),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_use",
-                tool_name="Bash",
-                tool_id="tool-bash-1",
-                command="git",
-                command_args="status",
-            ),
-            Event(
-                id=None,
-                uuid="bash-result-1",
-                timestamp=now - timedelta(hours=3, seconds=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_result",
-                tool_id="tool-bash-1",
-                is_error=True,
-            ),
-        ]
-        storage.add_events_batch(events)
-
-        result = query_error_details(storage, days=7)
+        result = query_error_details(error_corpus, days=7, now=error_corpus_now)
 
         assert result["days"] == 7
-        assert result["total_errors"] == 3
-        assert "Glob" in result["errors_by_tool"]
-        assert "Bash" in result["errors_by_tool"]
+        assert result["total_errors"] == 6
 
         # Glob should have aggregated the 2 errors with same pattern
         glob_errors = result["errors_by_tool"]["Glob"]
@@ -2074,110 +1993,70 @@ class TestQueryErrorDetails:
         assert glob_errors[0]["param_value"] == "*.py"
         assert glob_errors[0]["error_count"] == 2
 
-        # Bash should have 1 error
-        bash_errors = result["errors_by_tool"]["Bash"]
-        assert len(bash_errors) == 1
-        assert bash_errors[0]["param_type"] == "command"
-        assert bash_errors[0]["param_value"] == "git"
-        assert bash_errors[0]["error_count"] == 1
+        # Bash errors are keyed by command
+        bash_errors = {e["param_value"]: e for e in result["errors_by_tool"]["Bash"]}
+        assert set(bash_errors) == {"git", "make"}
+        assert bash_errors["git"]["param_type"] == "command"
+        assert bash_errors["git"]["error_count"] == 1
+
+    @pytest.mark.parametrize(
+        "tool_filter,days,expected_tools,expected_total",
+        [
+            (None, 7, {"Glob", "Bash", "Grep", "Edit"}, 6),
+            ("Glob", 7, {"Glob"}, 2),
+            ("Bash", 7, {"Bash"}, 2),
+            ("Glob", 30, {"Glob"}, 3),
+        ],
+    )
+    def test_tool_and_days_filters(
+        self, error_corpus, error_corpus_now, tool_filter, days, expected_tools, expected_total
+    ):
+        """Test filtering errors by tool and by lookback window."""
+        result = query_error_details(
+            error_corpus, days=days, tool=tool_filter, now=error_corpus_now
+        )
 
-    def test_tool_filter(self, storage):
-        """Test filtering errors by specific tool."""
-        import json
+        assert result["tool_filter"] == tool_filter
+        assert set(result["errors_by_tool"]) == expected_tools
+        assert result["total_errors"] == expected_total
 
-        now = datetime.now()
+    def test_days_filter(self, error_corpus, error_corpus_now):
+        """Test that days filter excludes old errors."""
+        # 7 days should not see the 10-day-old pattern
+        result = query_error_details(error_corpus, days=7, tool="Glob", now=error_corpus_now)
+        assert [e["param_value"] for e in result["errors_by_tool"]["Glob"]] == ["*.py"]
 
-        events = [
-            # Glob error
-            Event(
-                id=None,
-                uuid="glob-use",
-                timestamp=now - timedelta(hours=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_use",
-                tool_name="Glob",
-                tool_id="tool-glob",
-                tool_input_json=json.dumps({"pattern": "*.rs"}),
-            ),
-            Event(
-                id=None,
-                uuid="glob-result",
-                timestamp=now - timedelta(hours=1, seconds=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_result",
-                tool_id="tool-glob",
-                is_error=True,
-            ),
-            # Bash error
-            Event(
-                id=None,
-                uuid="bash-use",
-                timestamp=now - timedelta(hours=2),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_use",
-                tool_name="Bash",
-                tool_id="tool-bash",
-                command="make",
-            ),
-            Event(
-                id=None,
-                uuid="bash-result",
-                timestamp=now - timedelta(hours=2, seconds=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_result",
-                tool_id="tool-bash",
-                is_error=True,
-            ),
-        ]
-        storage.add_events_batch(events)
+        # 30 days should include it
+        result_30 = query_error_details(error_corpus, days=30, tool="Glob", now=error_corpus_now)
+        patterns = {e["param_value"] for e in result_30["errors_by_tool"]["Glob"]}
+        assert patterns == {"*.py", "old"}
 
-        # Filter to only Glob errors
-        result = query_error_details(storage, days=7, tool="Glob")
+    def test_grep_pattern_with_search_path(self, error_corpus, error_corpus_now):
+        """Test that Grep errors include search_path when available."""
+        result = query_error_details(error_corpus, days=7, now=error_corpus_now)
 
-        assert result["tool_filter"] == "Glob"
-        assert result["total_errors"] == 1
-        assert "Glob" in result["errors_by_tool"]
-        assert "Bash" not in result["errors_by_tool"]
+        grep_errors = result["errors_by_tool"]["Grep"]
+        assert len(grep_errors) == 1
+        assert grep_errors[0]["param_type"] == "pattern"
+        assert grep_errors[0]["param_value"] == "TODO"
+        assert grep_errors[0]["search_path"] == "/src"
 
-    def test_limit_parameter(self, storage):
+    def test_limit_parameter(self, storage, now):
         """Test that limit parameter caps errors per tool."""
-        import json
-
-        now = datetime.now()
-
-        events = []
         # Create 5 different Glob errors with different patterns
-        for i in range(5):
-            events.extend(
-                [
-                    Event(
-                        id=None,
-                        uuid=f"glob-use-{i}",
-                        timestamp=now - timedelta(hours=i),
-                        session_id="s1",
-                        project_path="-test-project",
-                        entry_type="tool_use",
-                        tool_name="Glob",
-                        tool_id=f"tool-glob-{i}",
-                        tool_input_json=json.dumps({"pattern": f"pattern-{i}"}),
-                    ),
-                    Event(
-                        id=None,
-                        uuid=f"glob-result-{i}",
-                        timestamp=now - timedelta(hours=i, seconds=1),
-                        session_id="s1",
-                        project_path="-test-project",
-                        entry_type="tool_result",
-                        tool_id=f"tool-glob-{i}",
-                        is_error=True,
-                    ),
-                ]
-            )
-        storage.add_events_batch(events)
+        storage.add_events_batch(
+            [
+                event
+                for i in range(5)
+                for event in _make_error_event_pair(
+                    now,
+                    "Glob",
+                    f"tool-glob-{i}",
+                    hours_ago=i,
+                    tool_input_json=f'{{"pattern": "pattern-{i}"}}',
+                )
+            ]
+        )
 
         # Limit to 2 per tool
         result = query_error_details(storage, days=7, limit=2)
@@ -2186,81 +2065,63 @@ class TestQueryErrorDetails:
         assert len(result["errors_by_tool"]["Glob"]) == 2
         assert result["tool_totals"]["Glob"] == 5
 
-    def test_file_path_errors(self, storage):
-        """Test that file operation errors show file_path."""
-        now = datetime.now()
+    @pytest.mark.parametrize("limit", [0, 1])
+    def test_limit_keeps_most_frequent_and_totals(self, error_corpus, error_corpus_now, limit):
+        """Test that the per-tool cap keeps the top groups and leaves totals intact."""
+        result = query_error_details(error_corpus, days=7, limit=limit, now=error_corpus_now)
 
-        events = [
-            Event(
-                id=None,
-                uuid="edit-use",
-                timestamp=now - timedelta(hours=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_use",
-                tool_name="Edit",
-                tool_id="tool-edit",
-                file_path="/path/to/missing.py",
-            ),
-            Event(
-                id=None,
-                uuid="edit-result",
-                timestamp=now - timedelta(hours=1, seconds=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_result",
-                tool_id="tool-edit",
-                is_error=True,
-            ),
-        ]
-        storage.add_events_batch(events)
+        assert result["tool_totals"] == {"Glob": 2, "Bash": 2, "Grep": 1, "Edit": 1}
+        assert result["total_errors"] == 6
+        assert all(len(errors) == limit for errors in result["errors_by_tool"].values())
+        if limit:
+            assert result["errors_by_tool"]["Glob"][0]["error_count"] == 2
 
-        result = query_error_details(storage, days=7)
+    def test_file_path_errors(self, error_corpus, error_corpus_now):
+        """Test that file operation errors show file_path."""
+        result = query_error_details(error_corpus, days=7, tool="Edit", now=error_corpus_now)
 
-        assert "Edit" in result["errors_by_tool"]
         edit_errors = result["errors_by_tool"]["Edit"]
         assert len(edit_errors) == 1
         assert edit_errors[0]["param_type"] == "file_path"
         assert edit_errors[0]["param_value"] == "/path/to/missing.py"
 
-    def test_grep_pattern_with_search_path(self, storage):
-        """Test that Grep errors include search_path when available."""
-        import json
+    def test_successful_results_ignored(self, storage, now):
+        """Test that tool calls whose result succeeded are not reported."""
+        storage.add_events_batch(
+            [
+                *_make_error_event_pair(now, "Bash", "tool-ok", hours_ago=1, is_error=False),
+                *_make_error_event_pair(now, "Bash", "tool-fail", hours_ago=1, command="make"),
+            ]
+        )
 
-        now = datetime.now()
+        result = query_error_details(storage, days=7)
 
-        events = [
-            Event(
-                id=None,
-                uuid="grep-use",
-                timestamp=now - timedelta(hours=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_use",
-                tool_name="Grep",
-                tool_id="tool-grep",
-                tool_input_json=json.dumps({"pattern": "TODO", "path": "/src"}),
-            ),
-            Event(
-                id=None,
-                uuid="grep-result",
-                timestamp=now - timedelta(hours=1, seconds=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_result",
-                tool_id="tool-grep",
-                is_error=True,
-            ),
-        ]
-        storage.add_events_batch(events)
+        assert result["tool_totals"] == {"Bash": 1}
+        assert result["errors_by_tool"]["Bash"][0]["param_value"] == "make"
 
-        result = query_error_details(storage, days=7)
+    def test_query_count_independent_of_error_count(self, storage, now, monkeypatch):
+        """Test that errors are correlated with their tool_use in one join, not per row."""
+        calls = []
+        execute_query = storage.execute_query
+        monkeypatch.setattr(
+            storage, "execute_query", lambda *args: calls.append(args) or execute_query(*args)
+        )
 
-        grep_errors = result["errors_by_tool"]["Grep"]
-        assert len(grep_errors) == 1
-        assert grep_errors[0]["param_type"] == "pattern"
-        assert grep_errors[0]["param_value"] == "TODO"
-        assert grep_errors[0]["search_path"] == "/src"
+        def queries_for(n: int) -> int:
+            storage.add_events_batch(
+                [
+                    event
+                    for i in range(n)
+                    for event in _make_error_event_pair(
+                        now, "Bash", f"tool-{n}-{i}", hours_ago=1, command=f"cmd-{i}"
+                    )
+                ]
+            )
+            calls.clear()
+            query_error_details(storage, days=7, limit=100)
+            return len(calls)
+
+        assert queries_for(1) == queries_for(20)
 
     def test_no_errors(self, storage):
         """Test with no errors in the database."""
@@ -2269,69 +2130,6 @@ class TestQueryErrorDetails:
         assert result["total_errors"] == 0
         assert result["errors_by_tool"] == {}
 
-    def test_days_filter(self, storage):
-        """Test that days filter excludes old errors."""
-        import json
-
-        now = datetime.now()
-
-        events = [
-            # Recent error (1 hour ago)
-            Event(
-                id=None,
-                uuid="recent-use",
-                timestamp=now - timedelta(hours=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_use",
-                tool_name="Glob",
-                tool_id="tool-recent",
-                tool_input_json=json.dumps({"pattern": "recent"}),
-            ),
-            Event(
-                id=None,
-                uuid="recent-result",
-                timestamp=now - timedelta(hours=1, seconds=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_result",
-                tool_id="tool-recent",
-                is_error=True,
-            ),
-            # Old error (10 days ago)
-            Event(
-                id=None,
-                uuid="old-use",
-                timestamp=now - timedelta(days=10),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_use",
-                tool_name="Glob",
-                tool_id="tool-old",
-                tool_input_json=json.dumps({"pattern": "old"}),
-            ),
-            Event(
-                id=None,
-                uuid="old-result",
-                timestamp=now - timedelta(days=10, seconds=1),
-                session_id="s1",
-                project_path="-test-project",
-                entry_type="tool_result",
-                tool_id="tool-old",
-                is_error=True,
-            ),
-        ]
-        storage.add_events_batch(events)
-
-        # 7 days should only get recent error
-        result = query_error_details(storage, days=7)
-        assert result["total_errors"] == 1
-        assert result["errors_by_tool"]["Glob"][0]["param_value"] == "recent"
-
-        # 30 days should get both errors
-        result_30 = query_error_details(storage, days=30)
-        assert result_30["total_errors"] == 2
-
 
 # Issue #69: Compaction and context efficiency tests
 
@@ -1,5 +1,11 @@
 """Tests for the MCP server."""
 
+import json
+import subprocess
+from datetime import datetime
+
+import pytest
+
 from session_analytics.server import (
     analyze_failures,
     analyze_pre_compaction_patterns,
@@ -33,102 +39,125 @@ from session_analytics.server import (
     search_messages,
 )
 
-
-def test_get_status():
-    """Test that get_status returns expected fields."""
+# (endpoint, kwargs, keys the response must contain, key whose value must be a list)
+ENDPOINT_CONTRACTS = [
+    (get_status, {}, {"version", "db_path", "event_count", "session_count"}, None),
+    (get_tool_frequency, {"days": 7}, {"days", "total_tool_calls", "tools"}, "tools"),
+    (get_session_events, {"limit": 10}, {"start", "end", "events"}, "events"),
+    (get_command_frequency, {"days": 7}, {"days", "total_commands", "commands"}, "commands"),
+    (list_sessions, {"days": 7}, {"days", "session_count", "sessions"}, "sessions"),
+    (get_token_usage, {"days": 7, "by": "day"}, {"days", "group_by", "breakdown"}, "breakdown"),
+    (
+        get_tool_sequences,
+        {"days": 7, "min_count": 1, "length": 2},
+        {"days", "sequences"},
+        "sequences",
+    ),
+    (get_permission_gaps, {"days": 7, "min_count": 1}, {"days", "gaps"}, "gaps"),
+    (
+        get_insights,
+        {"refresh": True, "days": 7},
+        {"tool_frequency", "sequences", "permission_gaps", "summary"},
+        None,
+    ),
+    (get_session_messages, {"days": 1, "limit": 10}, {"hours", "journey"}, "journey"),
+    (
+        detect_parallel_sessions,
+        {"days": 1, "min_overlap_minutes": 5},
+        {"hours", "parallel_periods"},
+        "parallel_periods",
+    ),
+    (
+        find_related_sessions,
+        {"session_id": "nonexistent-session", "method": "files", "days": 7},
+        {"session_id", "method", "related_sessions"},
+        "related_sessions",
+    ),
+    (
+        analyze_failures,
+        {"days": 7, "rework_window_minutes": 10},
+        {"days", "total_errors", "rework_patterns"},
+        None,
+    ),
+    (classify_sessions, {"days": 7}, {"days", "sessions"}, "sessions"),
+    (
+        analyze_trends,
+        {"days": 7, "compare_to": "previous"},
+        {"days", "compare_to", "metrics"},
+        None,
+    ),
+    (correlate_git_with_sessions, {"days": 7}, {"days", "commits_correlated"}, None),
+    (
+        get_session_signals,
+        {"days": 7, "min_count": 1},
+        {"days", "sessions_analyzed", "sessions"},
+        "sessions",
+    ),
+    (
+        get_file_activity,
+        {"days": 7, "limit": 20, "collapse_worktrees": False},
+        {"days", "file_count", "files"},
+        "files",
+    ),
+    (get_languages, {"days": 7}, {"days", "total_operations", "languages"}, "languages"),
+    (get_projects, {"days": 7}, {"days", "project_count", "projects"}, "projects"),
+    (get_mcp_usage, {"days": 7}, {"days", "total_mcp_calls", "servers"}, "servers"),
+]
+
+
+@pytest.mark.parametrize(
+    "endpoint,kwargs,required,list_key",
+    ENDPOINT_CONTRACTS,
+    ids=[contract[0].name for contract in ENDPOINT_CONTRACTS],
+)
+def test_endpoint_contract(endpoint, kwargs, required, list_key):
+    """Test that each endpoint succeeds and returns its documented fields."""
     # FastMCP wraps functions - access the underlying fn
-    result = get_status.fn()
-    assert result["status"] == "ok"
-    assert "version" in result
-    assert "db_path" in result
-    assert "event_count" in result
-    assert "session_count" in result
+    result = endpoint.fn(**kwargs)
+    assert result["status"] == "ok"
+    assert required <= result.keys()
+    if list_key:
+        assert isinstance(result[list_key], list)
+
+
+def test_ingest_logs(logs_dir):
+    """Test that ingest_logs ingests a synthetic log tree instead of the real ~/.claude logs."""
+    project_dir = logs_dir / "-server-test-project"
+    project_dir.mkdir()
+    entry = {
+        "type": "user",
+        "uuid": "server-ingest-user-1",
+        "sessionId": "server-ingest-session",
+        "timestamp": datetime.now().isoformat(),
+        "message": {"role": "user", "content": "Hello"},
+    }
+    (project_dir / "session.jsonl").write_text(json.dumps(entry) + "\n")
 
-
-def test_ingest_logs():
-    """Test that ingest_logs runs and returns stats."""
     result = ingest_logs.fn(days=1)
     assert result["status"] == "ok"
-    assert "files_found" in result
-    assert "events_added" in result
-
-
-def test_get_tool_frequency():
-    """Test that get_tool_frequency returns tool counts."""
-    result = get_tool_frequency.fn(days=7)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "total_tool_calls" in result
-    assert "tools" in result
-    assert isinstance(result["tools"], list)
-
-
-def test_get_session_events():
-    """Test that get_session_events returns events."""
-    result = get_session_events.fn(limit=10)
-    assert result["status"] == "ok"
-    assert "start" in result
-    assert "end" in result
-    assert "events" in result
-    assert isinstance(result["events"], list)
-
-
-def test_get_command_frequency():
-    """Test that get_command_frequency returns command counts."""
-    result = get_command_frequency.fn(days=7)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "total_commands" in result
-    assert "commands" in result
-    assert isinstance(result["commands"], list)
-
-
-def test_list_sessions():
-    """Test that list_sessions returns session info."""
-    result = list_sessions.fn(days=7)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "session_count" in result
-    assert "sessions" in result
-    assert isinstance(result["sessions"], list)
-
-
-def test_get_token_usage():
-    """Test that get_token_usage returns token breakdown."""
-    result = get_token_usage.fn(days=7, by="day")
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "group_by" in result
-    assert "breakdown" in result
-    assert isinstance(result["breakdown"], list)
-
+    assert result["files_found"] == 1
+    assert result["events_added"] == 1
 
-def test_get_tool_sequences():
-    """Test that get_tool_sequences returns sequence patterns."""
-    result = get_tool_sequences.fn(days=7, min_count=1, length=2)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "sequences" in result
-    assert isinstance(result["sequences"], list)
 
+def test_ingest_git_history(tmp_path):
+    """Test that ingest_git_history ingests a throwaway repository with a known history."""
+    git = ["git", "-C", str(tmp_path), "-c", "user.name=Test", "-c", "user.email=test@example.com"]
+    subprocess.run([*git, "init", "-q"], check=True)
+    for i in range(3):
+        subprocess.run([*git, "commit", "-q", "--allow-empty", "-m", f"commit {i}"], check=True)
 
-def test_get_permission_gaps():
-    """Test that get_permission_gaps returns gap analysis."""
-    result = get_permission_gaps.fn(days=7, min_count=1)
+    result = ingest_git_history.fn(repo_path=str(tmp_path), days=7)
     assert result["status"] == "ok"
-    assert "days" in result
-    assert "gaps" in result
-    assert isinstance(result["gaps"], list)
+    assert result["commits_found"] == 3
+    assert result["commits_added"] == 3
 
 
-def test_get_insights():
-    """Test that get_insights returns organized patterns."""
-    result = get_insights.fn(refresh=True, days=7)
+def test_get_session_commits():
+    """Test that get_session_commits without a session_id groups commits by session."""
+    result = get_session_commits.fn(session_id=None, days=7)
     assert result["status"] == "ok"
-    assert "tool_frequency" in result
-    assert "sequences" in result
-    assert "permission_gaps" in result
-    assert "summary" in result
+    assert {"session_count", "total_commits", "sessions"} <= result.keys()
+    assert isinstance(result["sessions"], dict)
 
 
 def test_search_messages():
@@ -168,53 +197,6 @@ def test_sample_sequences_expand():
     assert result["parsed_tools"] == ["git", "Edit"]
 
 
-def test_get_session_messages():
-    """Test that get_session_messages returns user messages."""
-    result = get_session_messages.fn(days=1, limit=10)
-    assert result["status"] == "ok"
-    assert "hours" in result
-    assert "journey" in result
-    assert isinstance(result["journey"], list)
-
-
-def test_detect_parallel_sessions():
-    """Test that detect_parallel_sessions finds overlapping sessions."""
-    result = detect_parallel_sessions.fn(days=1, min_overlap_minutes=5)
-    assert result["status"] == "ok"
-    assert "hours" in result
-    assert "parallel_periods" in result
-    assert isinstance(result["parallel_periods"], list)
-
-
-def test_find_related_sessions():
-    """Test that find_related_sessions finds sessions sharing files/commands."""
-    # This needs a session_id, but we may not have one - test with empty result
-    result = find_related_sessions.fn(session_id="nonexistent-session", method="files", days=7)
-    assert result["status"] == "ok"
-    assert "session_id" in result
-    assert "method" in result
-    assert "related_sessions" in result
-    assert isinstance(result["related_sessions"], list)
-
-
-def test_analyze_failures():
-    """Test that analyze_failures returns failure analysis."""
-    result = analyze_failures.fn(days=7, rework_window_minutes=10)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "total_errors" in result
-    assert "rework_patterns" in result
-
-
-def test_classify_sessions():
-    """Test that classify_sessions categorizes sessions."""
-    result = classify_sessions.fn(days=7)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "sessions" in result
-    assert isinstance(result["sessions"], list)
-
-
 def test_get_handoff_context():
     """Test that get_handoff_context returns session context."""
     result = get_handoff_context.fn(session_id=None, days=0.17, limit=10)
@@ -223,92 +205,6 @@ def test_get_handoff_context():
     assert "session_id" in result or "error" in result
 
 
-def test_analyze_trends():
-    """Test that analyze_trends compares time periods."""
-    result = analyze_trends.fn(days=7, compare_to="previous")
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "compare_to" in result
-    assert "metrics" in result
-
-
-def test_ingest_git_history():
-    """Test that ingest_git_history ingests git commits."""
-    result = ingest_git_history.fn(repo_path=None, days=7)
-    assert result["status"] == "ok"
-    assert "commits_found" in result
-    assert "commits_added" in result
-
-
-def test_correlate_git_with_sessions():
-    """Test that correlate_git_with_sessions links commits to sessions."""
-    result = correlate_git_with_sessions.fn(days=7)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "commits_correlated" in result
-
-
-def test_get_session_signals():
-    """Test that get_session_signals returns raw session metrics."""
-    result = get_session_signals.fn(days=7, min_count=1)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "sessions_analyzed" in result
-    assert "sessions" in result
-    assert isinstance(result["sessions"], list)
-
-
-def test_get_session_commits():
-    """Test that get_session_commits returns commit associations."""
-    result = get_session_commits.fn(session_id=None, days=7)
-    assert result["status"] == "ok"
-    # Without session_id, returns session_count and sessions dict
-    assert "session_count" in result
-    assert "total_commits" in result
-    assert "sessions" in result
-    assert isinstance(result["sessions"], dict)
-
-
-def test_get_file_activity():
-    """Test that get_file_activity returns file read/write stats."""
-    result = get_file_activity.fn(days=7, limit=20, collapse_worktrees=False)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "file_count" in result
-    assert "files" in result
-    assert isinstance(result["files"], list)
-
-
-def test_get_languages():
-    """Test that get_languages returns language distribution."""
-    result = get_languages.fn(days=7)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "total_operations" in result
-    assert "languages" in result
-    assert isinstance(result["languages"], list)
-
-
-def test_get_projects():
-    """Test that get_projects returns project activity."""
-    result = get_projects.fn(days=7)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "project_count" in result
-    assert "projects" in result
-    assert isinstance(result["projects"], list)
-
-
-def test_get_mcp_usage():
-    """Test that get_mcp_usage returns MCP server/tool stats."""
-    result = get_mcp_usage.fn(days=7)
-    assert result["status"] == "ok"
-    assert "days" in result
-    assert "total_mcp_calls" in result
-    assert "servers" in result
-    assert isinstance(result["servers"], list)
-
-
 # Issue #77: Limit parameters for verbose endpoints
 
 
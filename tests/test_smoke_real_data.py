@@ -15,43 +15,101 @@ from pathlib import Path
 
 import pytest
 
-# Skip all tests in this file unless smoke test env var is set
-pytestmark = pytest.mark.skipif(
-    os.environ.get("SESSION_ANALYTICS_SMOKE_TEST") != "1",
-    reason="Smoke tests require SESSION_ANALYTICS_SMOKE_TEST=1 and real database",
-)
+REAL_DB_PATH = Path.home() / ".claude" / "contrib" / "analytics" / "data.db"
 
+# Skip all tests in this file unless smoke test env var is set and the real
+# database exists (checked once here, before any fixture runs)
+pytestmark = [
+    pytest.mark.skipif(
+        os.environ.get("SESSION_ANALYTICS_SMOKE_TEST") != "1",
+        reason="Smoke tests require SESSION_ANALYTICS_SMOKE_TEST=1 and real database",
+    ),
+    pytest.mark.skipif(not REAL_DB_PATH.exists(), reason="Real database not found"),
+]
 
-@pytest.fixture
+
+@pytest.fixture(scope="module")
 def real_storage():
-    """Get storage instance pointing to real database."""
+    """Get storage instance pointing to real database (opened once per module)."""
     from session_analytics.storage import SQLiteStorage
 
-    db_path = Path.home() / ".claude" / "contrib" / "analytics" / "data.db"
-    if not db_path.exists():
-        pytest.skip("Real database not found")
-    return SQLiteStorage(db_path)
+    return SQLiteStorage(REAL_DB_PATH)
+
+
+@pytest.fixture(scope="module")
+def smoke_counts(real_storage):
+    """Scalar data-quality stats, computed together in one scan of events.
+
+    The checks below are independent aggregates over the whole table (counts,
+    result-size and token ranges); asking for them in a single SELECT reads
+    events once instead of once per test.
+    """
+    rows = real_storage.execute_query(
+        """
+        SELECT
+            COUNT(CASE WHEN entry_type = 'compaction' THEN 1 END) as compactions,
+            COUNT(
+                CASE WHEN entry_type = 'user'
+                      AND message_text LIKE '%continued from a previous conversation%'
+                THEN 1 END
+            ) as undetected_compactions,
+            COUNT(
+                CASE WHEN entry_type = 'compaction' AND tool_name IS NOT NULL THEN 1 END
+            ) as tool_compactions,
+            COUNT(CASE WHEN is_error = 1 AND message_text = 'Warmup' THEN 1 END) as warmup_errors,
+            COUNT(message_text) as with_message_text,
+            COUNT(
+                CASE WHEN message_text IS NOT NULL AND result_size_bytes IS NOT NULL THEN 1 END
+            ) as sized_message_text,
+            MIN(result_size_bytes) as min_result_size,
+            MAX(result_size_bytes) as max_result_size,
+            AVG(result_size_bytes) as avg_result_size,
+            COUNT(
+                CASE WHEN entry_type = 'assistant' AND model IS NOT NULL AND model != 'unknown'
+                THEN 1 END
+            ) as model_assistants,
+            COUNT(
+                CASE WHEN entry_type = 'assistant' AND model IS NOT NULL AND model != 'unknown'
+                      AND (input_tokens > 0 OR output_tokens > 0)
+                THEN 1 END
+            ) as model_assistants_with_tokens,
+            MAX(
+                CASE WHEN entry_type = 'assistant' AND (input_tokens > 0 OR output_tokens > 0)
+                THEN input_tokens END
+            ) as max_input_tokens,
+            MAX(
+                CASE WHEN entry_type = 'assistant' AND (input_tokens > 0 OR output_tokens > 0)
+                THEN output_tokens END
+            ) as max_output_tokens
+        FROM events
+        """
+    )
+    return dict(rows[0])
+
+
+@pytest.fixture(scope="module")
+def entry_type_counts(real_storage):
+    """Event count per entry_type, from one GROUP BY shared by the distribution checks."""
+    rows = real_storage.execute_query(
+        """
+        SELECT entry_type, COUNT(*) as count
+        FROM events
+        GROUP BY entry_type
+        ORDER BY count DESC
+        """
+    )
+    return {r["entry_type"]: r["count"] for r in rows}
 
 
 class TestCompactionDetection:
     """Validate compaction detection is working."""
 
-    def test_compaction_entries_exist(self, real_storage):
+    def test_compaction_entries_exist(self, smoke_counts):
         """Compaction entries should exist if sessions have context resets."""
-        rows = real_storage.execute_query(
-            "SELECT COUNT(*) as count FROM events WHERE entry_type = 'compaction'"
-        )
-        compaction_count = rows[0]["count"]
-
-        # Also check for undetected compactions (marker in user entries)
-        rows = real_storage.execute_query(
-            """
-            SELECT COUNT(*) as count FROM events
-            WHERE entry_type = 'user'
-              AND message_text LIKE '%continued from a previous conversation%'
-            """
-        )
-        undetected = rows[0]["count"]
+        compaction_count = smoke_counts["compactions"]
+        # Also check for undetected compactions (marker in user entries). This
+        # reads message_text itself, the same text detect_compaction() saw at ingest.
+        undetected = smoke_counts["undetected_compactions"]
 
         # Fail if there are undetected compactions
         assert undetected == 0, (
@@ -62,18 +120,11 @@ class TestCompactionDetection:
         # Info: how many compactions were detected
         print(f"\nCompaction entries detected: {compaction_count}")
 
-    def test_compaction_marker_not_in_tool_results(self, real_storage):
+    def test_compaction_marker_not_in_tool_results(self, smoke_counts):
         """Tool results shouldn't be mis-detected as compactions."""
         # The marker text may appear in tool results (e.g., GitHub issue body)
         # These should NOT be marked as compaction
-        rows = real_storage.execute_query(
-            """
-            SELECT COUNT(*) as count FROM events
-            WHERE entry_type = 'compaction'
-              AND tool_name IS NOT NULL
-            """
-        )
-        tool_compactions = rows[0]["count"]
+        tool_compactions = smoke_counts["tool_compactions"]
         assert tool_compactions == 0, (
             f"Found {tool_compactions} compaction entries with tool_name set. "
             "Compactions should only be user messages, not tool results."
@@ -83,19 +134,10 @@ class TestCompactionDetection:
 class TestResultSizeBytes:
     """Validate result_size_bytes is populated."""
 
-    def test_result_size_populated_for_message_text(self, real_storage):
+    def test_result_size_populated_for_message_text(self, smoke_counts):
         """Entries with message_text should have result_size_bytes."""
-        rows = real_storage.execute_query(
-            """
-            SELECT
-                COUNT(*) as total,
-                SUM(CASE WHEN result_size_bytes IS NOT NULL THEN 1 ELSE 0 END) as populated
-            FROM events
-            WHERE message_text IS NOT NULL
-            """
-        )
-        total = rows[0]["total"]
-        populated = rows[0]["populated"]
+        total = smoke_counts["with_message_text"]
+        populated = smoke_counts["sized_message_text"]
 
         # Allow some tolerance for entries added before migration
         population_rate = populated / total if total > 0 else 0
@@ -104,21 +146,11 @@ class TestResultSizeBytes:
             f"Expected >95%. Run migration 10 to backfill."
         )
 
-    def test_result_size_reasonable_values(self, real_storage):
+    def test_result_size_reasonable_values(self, smoke_counts):
         """result_size_bytes should have reasonable values."""
-        rows = real_storage.execute_query(
-            """
-            SELECT
-                MIN(result_size_bytes) as min_size,
-                MAX(result_size_bytes) as max_size,
-                AVG(result_size_bytes) as avg_size
-            FROM events
-            WHERE result_size_bytes IS NOT NULL
-            """
-        )
-        min_size = rows[0]["min_size"]
-        max_size = rows[0]["max_size"]
-        avg_size = rows[0]["avg_size"]
+        min_size = smoke_counts["min_result_size"]
+        max_size = smoke_counts["max_result_size"]
+        avg_size = smoke_counts["avg_result_size"]
 
         assert min_size >= 0, "result_size_bytes should not be negative"
         assert max_size < 100_000_000, f"Suspiciously large result: {max_size} bytes"
@@ -128,17 +160,9 @@ class TestResultSizeBytes:
 class TestEntryTypeDistribution:
     """Validate entry type distribution looks reasonable."""
 
-    def test_entry_types_present(self, real_storage):
+    def test_entry_types_present(self, entry_type_counts):
         """Core entry types should be present."""
-        rows = real_storage.execute_query(
-            """
-            SELECT entry_type, COUNT(*) as count
-            FROM events
-            GROUP BY entry_type
-            ORDER BY count DESC
-            """
-        )
-        entry_types = {r["entry_type"]: r["count"] for r in rows}
+        entry_types = entry_type_counts
 
         # These should always exist in real usage
         assert "assistant" in entry_types, "No assistant entries found"
@@ -151,20 +175,10 @@ class TestEntryTypeDistribution:
         for entry_type, count in entry_types.items():
             print(f"  {entry_type}: {count:,}")
 
-    def test_tool_use_tool_result_balance(self, real_storage):
+    def test_tool_use_tool_result_balance(self, entry_type_counts):
         """tool_use and tool_result counts should be similar."""
-        rows = real_storage.execute_query(
-            """
-            SELECT entry_type, COUNT(*) as count
-            FROM events
-            WHERE entry_type IN ('tool_use', 'tool_result')
-            GROUP BY entry_type
-            """
-        )
-        counts = {r["entry_type"]: r["count"] for r in rows}
-
-        tool_use = counts.get("tool_use", 0)
-        tool_result = counts.get("tool_result", 0)
+        tool_use = entry_type_counts.get("tool_use", 0)
+        tool_result = entry_type_counts.get("tool_result", 0)
 
         if tool_use > 0:
             ratio = tool_result / tool_use
@@ -179,21 +193,10 @@ class TestEntryTypeDistribution:
 class TestTokenData:
     """Validate token data looks reasonable."""
 
-    def test_tokens_on_assistant_entries(self, real_storage):
+    def test_tokens_on_assistant_entries(self, smoke_counts):
         """Assistant entries should have token data."""
-        rows = real_storage.execute_query(
-            """
-            SELECT
-                COUNT(*) as total,
-                SUM(CASE WHEN input_tokens > 0 OR output_tokens > 0 THEN 1 ELSE 0 END) as with_tokens
-            FROM events
-            WHERE entry_type = 'assistant'
-              AND model IS NOT NULL
-              AND model != 'unknown'
-            """
-        )
-        total = rows[0]["total"]
-        with_tokens = rows[0]["with_tokens"]
+        total = smoke_counts["model_assistants"]
+        with_tokens = smoke_counts["model_assistants_with_tokens"]
 
         if total > 0:
             token_rate = with_tokens / total
@@ -201,22 +204,10 @@ class TestTokenData:
                 f"Only {token_rate:.1%} of assistant entries have tokens. Expected >90%."
             )
 
-    def test_token_values_reasonable(self, real_storage):
+    def test_token_values_reasonable(self, smoke_counts):
         """Token values should be in reasonable ranges."""
-        rows = real_storage.execute_query(
-            """
-            SELECT
-                MAX(input_tokens) as max_input,
-                MAX(output_tokens) as max_output,
-                AVG(input_tokens) as avg_input,
-                AVG(output_tokens) as avg_output
-            FROM events
-            WHERE entry_type = 'assistant'
-              AND (input_tokens > 0 OR output_tokens > 0)
-            """
-        )
-        max_input = rows[0]["max_input"] or 0
-        max_output = rows[0]["max_output"] or 0
+        max_input = smoke_counts["max_input_tokens"] or 0
+        max_output = smoke_counts["max_output_tokens"] or 0
 
         # Claude's context window is ~200K, individual responses much smaller
         assert max_input < 500_000, f"Suspiciously high input_tokens: {max_input}"
@@ -230,14 +221,19 @@ class TestToolIdJoins:
 
     def test_tool_result_joins_to_tool_use(self, real_storage):
         """tool_result entries should join to tool_use via tool_id."""
+        # NOT EXISTS stops at the first matching tool_use. The unary + keeps
+        # entry_type from being used as an index key, so the probe seeks
+        # idx_events_tool_id rather than walking every tool_use row
         rows = real_storage.execute_query(
             """
             SELECT COUNT(*) as count
             FROM events e1
-            LEFT JOIN events e2 ON e1.tool_id = e2.tool_id AND e2.entry_type = 'tool_use'
             WHERE e1.entry_type = 'tool_result'
               AND e1.tool_id IS NOT NULL
-              AND e2.id IS NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM events e2
+                  WHERE e2.tool_id = e1.tool_id AND +e2.entry_type = 'tool_use'
+              )
             """
         )
         orphan_results = rows[0]["count"]
@@ -250,17 +246,9 @@ class TestToolIdJoins:
 class TestErrorClassification:
     """Validate error data quality."""
 
-    def test_warmup_not_counted_as_errors(self, real_storage):
+    def test_warmup_not_counted_as_errors(self, smoke_counts):
         """Warmup events should not be marked as errors."""
-        rows = real_storage.execute_query(
-            """
-            SELECT COUNT(*) as count
-            FROM events
-            WHERE is_error = 1
-              AND message_text = 'Warmup'
-            """
-        )
-        warmup_errors = rows[0]["count"]
+        warmup_errors = smoke_counts["warmup_errors"]
 
         # After migration 12, warmup events should not be marked as errors
         assert warmup_errors == 0, (
@@ -1,5 +1,6 @@
 """Tests for the SQLite storage layer."""
 
+from dataclasses import replace
 from datetime import datetime, timedelta
 
 import pytest
@@ -10,11 +11,35 @@ from session_analytics.storage import (
     IngestionState,
     Pattern,
     Session,
+    SQLiteStorage,
 )
 
 # Uses fixtures from conftest.py: storage, sample_event
 
 
+def _plan_details(storage, monkeypatch, run) -> list[str]:
+    """Call run() and return the EXPLAIN QUERY PLAN details of every query it issued.
+
+    Plans come from the statements the production code actually executes, so
+    they follow any change to the queries. Assert on index names only; the
+    rest of the detail text varies between SQLite versions.
+    """
+    statements = []
+    execute_query = storage.execute_query
+
+    def record(sql, params=()):
+        statements.append((sql, params))
+        return execute_query(sql, params)
+
+    monkeypatch.setattr(storage, "execute_query", record)
+    run()
+    return [
+        row["detail"]
+        for sql, params in statements
+        for row in execute_query(f"EXPLAIN QUERY PLAN {sql}", params)
+    ]
+
+
 class TestEventOperations:
     """Tests for event CRUD operations."""
 
@@ -285,6 +310,39 @@ class TestDbStats:
         assert stats["db_path"] is not None
 
 
+class TestInMemoryStorage:
+    """Tests for ":memory:" storage instances."""
+
+    def test_data_persists_across_operations(self, sample_event):
+        """Test that in-memory data survives between operations."""
+        storage = SQLiteStorage(":memory:")
+        storage.add_event(sample_event)
+        assert storage.get_db_stats()["event_count"] == 1
+
+    def test_instances_are_isolated(self, sample_event):
+        """Test that each in-memory instance gets its own database."""
+        first = SQLiteStorage(":memory:")
+        second = SQLiteStorage(":memory:")
+        first.add_event(sample_event)
+        assert second.get_db_stats()["event_count"] == 0
+
+    def test_copy_from(self, sample_event):
+        """Test that copy_from() replaces the database with the other's contents."""
+        source = SQLiteStorage(":memory:")
+        source.add_event(sample_event)
+        target = SQLiteStorage(":memory:")
+        target.copy_from(source)
+        assert target.get_db_stats()["event_count"] == 1
+
+    def test_storage_fixture_copy_is_complete(self, storage, sample_event):
+        """Test that the fixture's copy of the schema template has indexes and FTS."""
+        indexes = {row[1] for row in storage.execute_query("PRAGMA index_list(events)")}
+        assert "idx_events_session_timestamp" in indexes
+
+        storage.add_event(replace(sample_event, message_text="template search check"))
+        assert len(storage.search_messages("template")) == 1
+
+
 class TestGitCommitValidation:
     """Tests for GitCommit validation (RFC #17 Phase 1)."""
 
@@ -1064,6 +1122,82 @@ class TestAgentTrackingFields:
         indexes = {row[1] for row in rows}
         assert "idx_events_tool_id" in indexes
 
+    def test_index_on_session_timestamp(self, storage):
+        """Verify that idx_events_session_timestamp exists for per-session time scans."""
+        rows = storage.execute_query("PRAGMA index_list(events)")
+        indexes = {row[1] for row in rows}
+        assert "idx_events_session_timestamp" in indexes
+
+    def test_error_detail_join_uses_error_results_index(self, storage, monkeypatch):
+        """Verify query_error_details reads failures via the partial index and joins on tool_id."""
+        from session_analytics.queries import query_error_details
+
+        details = _plan_details(storage, monkeypatch, lambda: query_error_details(storage))
+        assert any("idx_events_error_results" in d for d in details)
+        assert any("idx_events_tool_id" in d for d in details)
+
+    @pytest.mark.parametrize(
+        "filters,index",
+        [
+            ({"session_id": "x"}, "idx_events_session_timestamp"),
+            ({"tool": "Bash"}, "idx_events_tool_timestamp"),
+        ],
+    )
+    def test_filtered_timeline_uses_composite_index(self, storage, monkeypatch, filters, index):
+        """Verify session/tool-filtered timelines read their (column, timestamp) index."""
+        from session_analytics.queries import query_timeline
+
+        details = _plan_details(storage, monkeypatch, lambda: query_timeline(storage, **filters))
+        assert any(index in d for d in details)
+
+    def test_compaction_window_uses_entry_type_index(self, storage, monkeypatch):
+        """Verify get_compaction_events reads its entry type's range of the composite index."""
+        from session_analytics.queries import get_compaction_events
+
+        details = _plan_details(storage, monkeypatch, lambda: get_compaction_events(storage))
+        assert any("idx_events_entry_type_timestamp" in d for d in details)
+
+    def test_mcp_usage_uses_tool_index(self, storage, monkeypatch):
+        """Verify query_mcp_usage's tool-name range reads idx_events_tool_timestamp."""
+        from session_analytics.queries import query_mcp_usage
+
+        details = _plan_details(storage, monkeypatch, lambda: query_mcp_usage(storage))
+        assert any("idx_events_tool_timestamp" in d for d in details)
+
+    @pytest.mark.parametrize("query_name", ["query_file_activity", "query_languages"])
+    def test_file_tool_counts_use_file_activity_index(self, storage, monkeypatch, query_name):
+        """Verify file activity and language breakdowns read idx_events_file_activity."""
+        from session_analytics import queries
+
+        query = getattr(queries, query_name)
+        details = _plan_details(storage, monkeypatch, lambda: query(storage, project="proj"))
+        assert any("idx_events_file_activity" in d for d in details)
+
+    def test_session_time_filter_uses_last_seen_index(self, storage, monkeypatch):
+        """Verify query_sessions' window filter reads idx_sessions_last_seen."""
+        from session_analytics.queries import query_sessions
+
+        details = _plan_details(storage, monkeypatch, lambda: query_sessions(storage))
+        assert any("idx_sessions_last_seen" in d for d in details)
+
+    def test_agent_top_tools_uses_agent_tools_index(self, storage, monkeypatch):
+        """Verify query_agent_activity's per-agent tool counts read idx_events_agent_tools."""
+        from session_analytics.queries import query_agent_activity
+
+        storage.add_event(
+            Event(
+                id=None,
+                uuid="agent-tool-1",
+                timestamp=datetime.now(),
+                session_id="session-1",
+                entry_type="tool_use",
+                tool_name="Read",
+                agent_id="a123",
+            )
+        )
+        details = _plan_details(storage, monkeypatch, lambda: query_agent_activity(storage, days=7))
+        assert any("idx_events_agent_tools" in d for d in details)
+
 
 # Issue #69: Context efficiency field tests
 